@@ -0,0 +1,273 @@
+import threading
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .game import Round
+from .journal import JournalError
+
+START_BALANCE = 10.0
+INSURANCE_FEE = 0.5
+
+SIDES = ("LONG", "SHORT")
+LONG, SHORT = 0, 1
+
+
+class BetError(Exception):
+    pass
+
+
+def _grow(arr: np.ndarray, n: int) -> np.ndarray:
+    if n <= len(arr):
+        return arr
+    out = np.zeros(max(n, len(arr) * 2), dtype=arr.dtype)
+    out[:len(arr)] = arr
+    return out
+
+
+class Accounts:
+    """Балансы и последний итог по пользователям, колонками (индекс = номер пользователя)."""
+
+    COLUMNS = {
+        "balance": np.float64,
+        "last_round": np.int64,      # 0 — ещё не играл
+        "last_win": np.bool_,
+        "last_payout": np.float64,
+        "last_gold": np.int64,
+        "last_open": np.float64,
+        "last_close": np.float64,
+        "last_side": np.int8,
+        "last_amount": np.float64,
+        "last_insurance": np.bool_,
+    }
+
+    def __init__(self, capacity: int = 1024):
+        self.index: Dict[str, int] = {}
+        self.ids: List[str] = []
+        for name, dtype in self.COLUMNS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def ensure(self, user_id: str) -> int:
+        i = self.index.get(user_id)
+        if i is None:
+            i = len(self.ids)
+            for name in self.COLUMNS:
+                setattr(self, name, _grow(getattr(self, name), i + 1))
+            self.balance[i] = START_BALANCE
+            self.ids.append(user_id)
+            self.index[user_id] = i
+        return i
+
+    def last_result(self, i: int) -> Optional[Dict[str, Any]]:
+        if self.last_round[i] == 0:
+            return None
+        return {
+            "round_id": int(self.last_round[i]),
+            "win": bool(self.last_win[i]),
+            "payout": float(self.last_payout[i]),
+            "gold_mult": int(self.last_gold[i]),
+            "open": float(self.last_open[i]),
+            "close": float(self.last_close[i]),
+            "side": SIDES[self.last_side[i]],
+            "amount": float(self.last_amount[i]),
+            "insurance": bool(self.last_insurance[i]),
+        }
+
+
+class BetBook:
+    """Ставки текущего раунда колонками: по одной строке на пользователя."""
+
+    def __init__(self, capacity: int = 1024):
+        self.row: Dict[int, int] = {}  # индекс пользователя -> строка
+        self.user = np.zeros(capacity, dtype=np.int64)
+        self.side = np.zeros(capacity, dtype=np.int8)
+        self.amount = np.zeros(capacity, dtype=np.float64)
+        self.insurance = np.zeros(capacity, dtype=np.bool_)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def place(self, user: int, side: int, amount: float, insurance: bool):
+        j = self.row.get(user)
+        if j is None:
+            # повторная ставка в том же раунде перезаписывает прежнюю (как и раньше)
+            j = self.n
+            self.n += 1
+            self.user = _grow(self.user, self.n)
+            self.side = _grow(self.side, self.n)
+            self.amount = _grow(self.amount, self.n)
+            self.insurance = _grow(self.insurance, self.n)
+            self.row[user] = j
+        self.user[j] = user
+        self.side[j] = side
+        self.amount[j] = amount
+        self.insurance[j] = insurance
+
+    def get(self, user: int) -> Optional[Dict[str, Any]]:
+        j = self.row.get(user)
+        if j is None:
+            return None
+        return {
+            "side": SIDES[self.side[j]],
+            "amount": float(self.amount[j]),
+            "insurance": bool(self.insurance[j]),
+        }
+
+    def remove(self, user: int):
+        # последнюю строку переносим на место удалённой — колонки остаются плотными
+        j = self.row.pop(user, None)
+        if j is None:
+            return
+        last = self.n - 1
+        if j != last:
+            moved = int(self.user[last])
+            self.user[j] = moved
+            self.side[j] = self.side[last]
+            self.amount[j] = self.amount[last]
+            self.insurance[j] = self.insurance[last]
+            self.row[moved] = j
+        self.n = last
+
+    def clear(self):
+        self.row.clear()
+        self.n = 0
+
+
+def compute_payouts(side: np.ndarray, amount: np.ndarray, insurance: np.ndarray,
+                    up: bool, gold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Выигрыш x2 (x gold_mult, если есть), проигрыш со страховкой возвращает 50%."""
+    win = (side == LONG) if up else (side == SHORT)
+    won = amount * 2.0
+    if gold > 0:
+        won = won * gold
+    lost = amount * np.where(insurance, 0.5, 0.0)
+    return win, np.where(win, won, lost)
+
+
+class Ledger:
+    def __init__(self):
+        self.accounts = Accounts()
+        self.book = BetBook()
+        self.lock = threading.Lock()
+        self.journal = None  # app.journal.Journal, если включена запись на диск
+
+    def on_round(self, r: Round):
+        pass
+
+    def ensure_user(self, user_id: str) -> float:
+        with self.lock:
+            return float(self.accounts.balance[self.accounts.ensure(user_id)])
+
+    def bet_count(self) -> int:
+        return len(self.book)
+
+    def balance(self, user_id: str) -> Optional[float]:
+        i = self.accounts.index.get(user_id)
+        return None if i is None else float(self.accounts.balance[i])
+
+    def get_bet(self, user_id: str) -> Optional[Dict[str, Any]]:
+        i = self.accounts.index.get(user_id)
+        return None if i is None else self.book.get(i)
+
+    def last_result(self, user_id: str) -> Optional[Dict[str, Any]]:
+        i = self.accounts.index.get(user_id)
+        return None if i is None else self.accounts.last_result(i)
+
+    def results_for(self, user_ids: List[str], round_id: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """Итоги раунда round_id с текущим балансом — для тех из user_ids, кто в нём ставил."""
+        out = []
+        with self.lock:
+            a = self.accounts
+            for user_id in user_ids:
+                i = a.index.get(user_id)
+                if i is not None and a.last_round[i] == round_id:
+                    out.append((user_id, {**a.last_result(i), "balance": float(a.balance[i])}))
+        return out
+
+    def place_bet(self, user_id: str, side: str, amount: float, insurance: bool) -> float:
+        """Проверка баланса, списание и запись ставки под одним локом. Возвращает новый баланс."""
+        total_cost = float(amount) + (INSURANCE_FEE if insurance else 0.0)
+        seq = 0
+        with self.lock:
+            if self.journal is not None:
+                self.journal.check()  # журнал встал — не принимаем ставку, которую не сможем сохранить
+            i = self.accounts.ensure(user_id)
+            if self.accounts.balance[i] < total_cost:
+                raise BetError("Not enough balance")
+            prev = self.book.get(i)
+            self.accounts.balance[i] -= total_cost
+            self.book.place(i, SIDES.index(side), float(amount), bool(insurance))
+            balance = float(self.accounts.balance[i])
+            if self.journal is not None:
+                # в журнал под тем же локом — порядок записей совпадает с порядком мутаций
+                seq = self.journal.append({"t": "bet", "u": user_id, "s": side, "a": float(amount), "i": bool(insurance)})
+        if seq:
+            # ответ — только после fsync (групповой коммит, лок уже отпущен)
+            try:
+                self.journal.wait(seq)
+            except JournalError:
+                # ставка не на диске — откатываем и в памяти, иначе её рассчитают, а после рестарта она пропадёт
+                with self.lock:
+                    self.accounts.balance[i] += total_cost
+                    if prev is None:
+                        self.book.remove(i)
+                    elif i in self.book.row:
+                        self.book.place(i, SIDES.index(prev["side"]), prev["amount"], prev["insurance"])
+                raise
+        return balance
+
+    def settle(self, r: Round):
+        """Расчёт всей книги одним векторным проходом и массовое начисление."""
+        with self.lock:
+            b, a = self.book, self.accounts
+            n = b.n
+            if n == 0:
+                return
+            users = b.user[:n]
+            side, amount, insurance = b.side[:n], b.amount[:n], b.insurance[:n]
+
+            if self.journal is not None:
+                self.journal.append({"t": "settle", "round": asdict(r)})
+
+            win, payout = compute_payouts(side, amount, insurance, r.close > r.open, r.gold_mult)
+
+            a.balance[users] += payout
+            a.last_round[users] = r.round_id
+            a.last_win[users] = win
+            a.last_payout[users] = payout
+            a.last_gold[users] = r.gold_mult
+            a.last_open[users] = r.open
+            a.last_close[users] = r.close
+            a.last_side[users] = side
+            a.last_amount[users] = amount
+            a.last_insurance[users] = insurance
+
+    def clear_bets(self):
+        with self.lock:
+            self.book.clear()
+
+    def export(self) -> Tuple[Dict[str, np.ndarray], List[str], int]:
+        """Копия колонок аккаунтов для снимка и сегмент журнала, с которого его догонять.
+
+        Вызывать, когда книга ставок пуста (сразу после расчёта).
+        """
+        with self.lock:
+            n = len(self.accounts)
+            cols = {name: getattr(self.accounts, name)[:n].copy() for name in Accounts.COLUMNS}
+            segment = self.journal.rotate() if self.journal is not None else 0
+            return cols, list(self.accounts.ids), segment
+
+    def restore(self, cols: Dict[str, np.ndarray], ids: List[str]):
+        with self.lock:
+            a = Accounts(capacity=max(1024, len(ids)))
+            for name in Accounts.COLUMNS:
+                getattr(a, name)[:len(ids)] = cols[name]
+            a.ids = list(ids)
+            a.index = {u: i for i, u in enumerate(ids)}
+            self.accounts = a
+            self.book.clear()
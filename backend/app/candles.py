@@ -0,0 +1,115 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .game import POINTS_PER_CANDLE, SERIES_LEN, Round
+
+Candle = Tuple[int, float, float, float, float]  # (time сек, open, high, low, close)
+
+ROUNDS_PER_GROUP = 10
+
+# сколько свечей держим на каждое разрешение: память ограничена при любом аптайме
+CAPACITY = {
+    "10p": 60_000,    # свеча на 10 точек (1 сек RUN), ~2000 раундов
+    "round": 20_000,  # свеча на раунд
+    f"{ROUNDS_PER_GROUP}r": 20_000,
+}
+
+# seq свечи считается из round_id, а не из счётчика процесса: у всех воркеров
+# (и после рестарта) одна и та же свеча имеет один и тот же seq
+CANDLES_PER_ROUND = SERIES_LEN // POINTS_PER_CANDLE
+
+PAGE_LIMIT = 500
+PAGE_LIMIT_MAX = 5000
+
+
+def merge(candles: Sequence[Candle]) -> Candle:
+    return (
+        candles[0][0],
+        candles[0][1],
+        max(c[2] for c in candles),
+        min(c[3] for c in candles),
+        candles[-1][4],
+    )
+
+
+def group_of(round_id: int) -> int:
+    # группы выровнены по номерам раундов: 1..10, 11..20, …
+    return (round_id - 1) // ROUNDS_PER_GROUP
+
+
+class Ring:
+    """Последние capacity свечей с их seq (по возрастанию, возможны пропуски) для пагинации."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.seqs: List[int] = []
+        self.items: List[Candle] = []
+
+    @property
+    def first(self) -> int:
+        return self.seqs[0] if self.seqs else 0
+
+    @property
+    def end(self) -> int:
+        return self.seqs[-1] + 1 if self.seqs else 0
+
+    def extend(self, seqs: Sequence[int], items: Sequence[Candle]):
+        for seq, c in zip(seqs, items):
+            if seq >= self.end:  # повтор (тот же раунд ещё раз) не дублируем
+                self.seqs.append(seq)
+                self.items.append(c)
+        extra = len(self.seqs) - self.capacity
+        if extra > 0:
+            del self.seqs[:extra]
+            del self.items[:extra]
+
+    def page(self, from_seq: Optional[int], limit: int) -> Tuple[int, int, List[Candle]]:
+        """(from, next, свечи): next — seq, с которого просить следующую страницу."""
+        if from_seq is None:
+            i = max(0, len(self.seqs) - limit)  # без from — самые свежие
+        else:
+            i = bisect_left(self.seqs, from_seq)
+        items = self.items[i:i + limit]
+        if not items:
+            start = self.end if from_seq is None else max(from_seq, self.first)
+            return start, start, []
+        return self.seqs[i], self.seqs[i + len(items) - 1] + 1, items
+
+
+class CandleHistory:
+    def __init__(self):
+        self.rings: Dict[str, Ring] = {res: Ring(cap) for res, cap in CAPACITY.items()}
+        self._group: List[Tuple[int, Candle]] = []  # (round_id, свеча) закрытых раундов текущей группы
+
+    def add_round(self, r: Round, candles: Sequence[Tuple[float, float, float, float]]):
+        """Добавляет завершённый раунд: его посекундные свечи, свечу раунда и, если группа полна, свечу группы."""
+        if not candles:
+            return
+        t0 = r.start_ms // 1000
+        fine = [(t0 + i, o, h, l, c) for i, (o, h, l, c) in enumerate(candles[:CANDLES_PER_ROUND])]
+        base = r.round_id * CANDLES_PER_ROUND
+        self.rings["10p"].extend(range(base, base + len(fine)), fine)
+
+        whole = merge(fine)
+        self.rings["round"].extend([r.round_id], [whole])
+
+        g = group_of(r.round_id)
+        if self._group and group_of(self._group[0][0]) != g:
+            self._group = []  # группу видели не целиком (старт посреди неё, пропуск) — не выдаём
+        if not self._group or self._group[-1][0] < r.round_id:
+            self._group.append((r.round_id, whole))
+        if len(self._group) == ROUNDS_PER_GROUP:
+            self.rings[f"{ROUNDS_PER_GROUP}r"].extend([g], [merge([c for _, c in self._group])])
+            self._group = []
+
+    def page(self, res: str, from_seq: Optional[int] = None, limit: int = PAGE_LIMIT) -> dict:
+        ring = self.rings[res]
+        limit = max(1, min(limit, PAGE_LIMIT_MAX))
+        start, nxt, items = ring.page(from_seq, limit)
+        return {
+            "res": res,
+            "first": ring.first,
+            "from": start,
+            "next": nxt,
+            "candles": [{"time": t, "open": o, "high": h, "low": l, "close": c} for t, o, h, l, c in items],
+        }
@@ -0,0 +1,169 @@
+import json
+import math
+import time
+import secrets
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import List, NamedTuple, Optional, Tuple
+
+from .metrics import SERIES_BUILD
+
+BET_SEC = 7
+RUN_SEC = 30
+POINTS_PER_SEC = 10
+SERIES_LEN = RUN_SEC * POINTS_PER_SEC
+POINTS_PER_CANDLE = 10  # 1 свеча = 1 сек раунда
+
+# сколько последних раундов держим в кэше (текущий + пара предыдущих для отстающих клиентов)
+SERIES_CACHE_ROUNDS = 4
+
+
+class Series(NamedTuple):
+    round_id: int
+    points: List[float]
+    points_json: bytes  # уже сериализованный массив points, отдаём как есть
+    candles: List[Tuple[float, float, float, float]]  # (open, high, low, close) по POINTS_PER_CANDLE точек
+
+
+_series_cache: "OrderedDict[int, Series]" = OrderedDict()
+
+
+def series_points(seed: int, open_p: float, close_p: float, n: int):
+    if n < 2:
+        return [open_p]
+
+    amp = max(0.05, abs(close_p - open_p) * 0.35 + 0.08)
+
+    # всё, что зависит только от seed, считаем один раз, а не на каждую точку
+    a = (seed % 997) / 997.0
+    b = (seed % 389) / 389.0
+    c = (seed % 127) / 127.0
+    f1, p1 = 2.0 + 6.0 * a, (seed % 1000) * 0.001
+    f2, p2 = 5.0 + 9.0 * b, (seed % 777) * 0.002
+    f3, p3 = 9.0 + 7.0 * c, (seed % 555) * 0.003
+
+    diff = close_p - open_p
+    last = n - 1
+    sin = math.sin
+    tau = math.tau
+
+    pts = []
+    for i in range(n):
+        t = i / last
+        tt = t * tau
+        noise = (sin(tt * f1 + p1) * 0.55 + sin(tt * f2 + p2) * 0.30 + sin(tt * f3 + p3) * 0.15) * amp
+        pts.append(open_p + diff * t + noise)
+
+    pts[0] = open_p
+    pts[-1] = close_p
+    return pts
+
+
+def make_candles(points: List[float], per: int = POINTS_PER_CANDLE):
+    out = []
+    for i in range(0, len(points) - per + 1, per):
+        chunk = points[i:i + per]
+        out.append((chunk[0], max(chunk), min(chunk), chunk[-1]))
+    return out
+
+
+def build_series(round_id: int, seed: int, open_p: float, close_p: float) -> Series:
+    """Строит кривую раунда один раз и кладёт её в кэш (старые раунды вытесняются)."""
+    with SERIES_BUILD.time():
+        pts = series_points(seed, open_p, close_p, SERIES_LEN)
+    s = Series(round_id, pts, json.dumps(pts, separators=(",", ":")).encode(), make_candles(pts))
+
+    _series_cache[round_id] = s
+    _series_cache.move_to_end(round_id)
+    while len(_series_cache) > SERIES_CACHE_ROUNDS:
+        _series_cache.popitem(last=False)
+    return s
+
+
+def get_series(round_id: int) -> Optional[Series]:
+    return _series_cache.get(round_id)
+
+
+# ===== round =====
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def new_seed() -> int:
+    return int.from_bytes(secrets.token_bytes(4), "big")
+
+
+def gen_gold_mult(seed: int) -> int:
+    return (1 + (seed % 7)) if (seed % 100 == 0) else 0
+
+
+def calc_open_close(seed: int, base: float = 100.0):
+    x = (seed % 2000) / 1000.0
+    delta = (x - 1.0) * 2.0
+    return base, round(base + delta, 3)
+
+
+@dataclass(frozen=True)
+class Round:
+    """Неизменяемый снимок раунда: планировщик подменяет его целиком, хендлеры только читают."""
+    round_id: int
+    phase: str  # BET | RUN | DONE
+    start_ms: int
+    end_ms: int
+    seed: int
+    gold_mult: int
+    open: float
+    close: float
+
+    def with_phase(self, phase: str) -> "Round":
+        return replace(self, phase=phase)
+
+    def header(self, server_ms: int) -> dict:
+        return {
+            "round_id": self.round_id,
+            "phase": self.phase,
+            "server_ms": server_ms,
+            "start_ms": self.start_ms,
+            "end_ms": self.end_ms,
+            "seed": self.seed,
+            "open": self.open,
+            "close": self.close,
+            "gold_mult": self.gold_mult,
+            "bet_sec": BET_SEC,
+            "run_sec": RUN_SEC,
+        }
+
+
+def first_round() -> Round:
+    t = now_ms()
+    r = Round(
+        round_id=1,
+        phase="BET",
+        start_ms=t + BET_SEC * 1000,
+        end_ms=t + (BET_SEC + RUN_SEC) * 1000,
+        seed=new_seed(),
+        gold_mult=0,
+        open=100.0,
+        close=100.0,
+    )
+    build_series(r.round_id, r.seed, r.open, r.close)
+    return r
+
+
+def next_round(prev: Round) -> Round:
+    seed = new_seed()
+    o, c = calc_open_close(seed, prev.close)
+    # новый раунд отсчитываем от конца предыдущего, чтобы время расчёта не копилось в сдвиг
+    t0 = max(prev.end_ms, now_ms())
+    r = Round(
+        round_id=prev.round_id + 1,
+        phase="BET",
+        start_ms=t0 + BET_SEC * 1000,
+        end_ms=t0 + (BET_SEC + RUN_SEC) * 1000,
+        seed=seed,
+        gold_mult=gen_gold_mult(seed),
+        open=o,
+        close=c,
+    )
+    build_series(r.round_id, r.seed, r.open, r.close)
+    return r
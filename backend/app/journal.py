@@ -0,0 +1,241 @@
+import logging
+import os
+import threading
+import time
+import zlib
+from dataclasses import asdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from .game import Round
+
+SNAPSHOT = "snapshot.npz"
+
+log = logging.getLogger("uvicorn.error")
+
+
+class JournalError(Exception):
+    """Журнал не смог записать данные на диск; новые мутации не принимаются."""
+
+
+def _segment_no(name: str) -> Optional[int]:
+    # journal-000042.log -> 42
+    if name.startswith("journal-") and name.endswith(".log"):
+        try:
+            return int(name[8:-4])
+        except ValueError:
+            return None
+    return None
+
+
+def _fsync_dir(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """Append-only журнал мутаций с групповым коммитом.
+
+    append() только кладёт запись в буфер; фоновый поток собирает всё, что
+    пришло за flush_ms (и пока шёл прошлый fsync), пишет одним write + fsync
+    и будит ждущих в wait().
+    Формат строки: "<crc32 hex> <json>\\n" — оборванный хвост после сбоя
+    отбрасывается при чтении.
+    """
+
+    def __init__(self, path: str, flush_ms: float = 2.0):
+        self.path = path
+        self.flush_sec = flush_ms / 1000
+        os.makedirs(path, exist_ok=True)
+
+        self.lock = threading.Lock()             # буфер и счётчики
+        self.io_lock = threading.Lock()          # файл сегмента
+        self.durable = threading.Condition(self.lock)
+        self.pending = threading.Condition(self.lock)
+        self.first_at = 0.0    # когда в пустой буфер пришла первая запись
+        self.buf: List[bytes] = []
+        self.seq = 0           # последняя принятая запись
+        self.synced = 0        # последняя записанная на диск
+        self.fsyncs = 0
+        self.error: Optional[BaseException] = None  # первая ошибка записи; дальше журнал стоит
+
+        self.segment = 0
+        self.f = None
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+
+    # ===== чтение (восстановление) =====
+    def segments(self) -> List[int]:
+        return sorted(n for n in (_segment_no(x) for x in os.listdir(self.path)) if n is not None)
+
+    def _segment_path(self, n: int) -> str:
+        return os.path.join(self.path, f"journal-{n:06d}.log")
+
+    def load_snapshot(self) -> Optional[Dict[str, Any]]:
+        p = os.path.join(self.path, SNAPSHOT)
+        if not os.path.exists(p):
+            return None
+        with np.load(p) as z:
+            snap = {k: z[k] for k in z.files}
+        snap["meta"] = orjson.loads(snap["meta"].tobytes())
+        snap["ids"] = orjson.loads(snap["ids"].tobytes())
+        return snap
+
+    def records(self, from_segment: int) -> Iterator[Dict[str, Any]]:
+        for n in self.segments():
+            if n < from_segment:
+                continue
+            with open(self._segment_path(n), "rb") as f:
+                for line in f:
+                    crc, _, body = line.rstrip(b"\n").partition(b" ")
+                    if not line.endswith(b"\n") or int(crc or b"0", 16) != zlib.crc32(body):
+                        break  # недописанный хвост
+                    yield orjson.loads(body)
+
+    # ===== запись =====
+    def open(self):
+        """Открывает новый сегмент после восстановления и запускает поток группового коммита."""
+        segs = self.segments()
+        self._open_segment((segs[-1] + 1) if segs else 1)
+        self._thread = threading.Thread(target=self._writer, name="journal", daemon=True)
+        self._thread.start()
+
+    def _open_segment(self, n: int):
+        self.segment = n
+        self.f = open(self._segment_path(n), "ab", buffering=0)
+        _fsync_dir(self.path)
+
+    def append(self, rec: Dict[str, Any]) -> int:
+        body = orjson.dumps(rec)
+        line = b"%08x " % zlib.crc32(body) + body + b"\n"
+        with self.lock:
+            if not self.buf:
+                self.first_at = time.monotonic()
+                self.pending.notify()
+            self.buf.append(line)
+            self.seq += 1
+            return self.seq
+
+    def check(self):
+        if self.error is not None:
+            raise JournalError("journal write failed") from self.error
+
+    def wait(self, seq: int):
+        """Блокирует, пока запись seq не окажется на диске (fsync); JournalError, если запись упала."""
+        with self.lock:
+            while self.synced < seq and not self._stop:
+                self.check()
+                self.durable.wait()
+
+    def _flush(self):
+        with self.io_lock:
+            with self.lock:
+                buf, self.buf = self.buf, []
+                upto = self.seq
+            if buf:
+                self.f.write(b"".join(buf))
+                os.fsync(self.f.fileno())
+                self.fsyncs += 1
+            with self.lock:
+                self.synced = upto
+                self.durable.notify_all()
+
+    def _writer(self):
+        while not self._stop:
+            with self.lock:
+                while not self.buf and not self._stop:
+                    self.pending.wait()
+                linger = self.first_at + self.flush_sec - time.monotonic()
+            if linger > 0:
+                time.sleep(linger)
+            try:
+                self._flush()
+            except Exception as e:
+                # диск полон, EIO и т.п.: будим ждущих, чтобы /bet ответил ошибкой, а не висел
+                log.exception("journal write failed, segment %s", self.segment)
+                with self.lock:
+                    self.error = e
+                    self.durable.notify_all()
+                return
+
+    def rotate(self) -> int:
+        """Дописывает текущий сегмент и начинает новый; возвращает его номер."""
+        self.check()
+        self._flush()
+        with self.io_lock:
+            self.f.close()
+            self._open_segment(self.segment + 1)
+            return self.segment
+
+    def write_snapshot(self, arrays: Dict[str, np.ndarray], ids: List[str], meta: Dict[str, Any]):
+        """Атомарно (tmp + rename) пишет снимок и удаляет сегменты, которые он покрывает."""
+        tmp = os.path.join(self.path, SNAPSHOT + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                meta=np.frombuffer(orjson.dumps(meta), dtype=np.uint8),
+                ids=np.frombuffer(orjson.dumps(ids), dtype=np.uint8),
+                **arrays,
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, SNAPSHOT))
+        _fsync_dir(self.path)
+        for n in self.segments():
+            if n < meta["segment"]:
+                os.remove(self._segment_path(n))
+
+    def close(self):
+        if self._thread is not None:
+            if self.error is None:
+                self._flush()
+            with self.lock:
+                self._stop = True
+                self.pending.notify()
+            self._thread.join()
+            self._thread = None
+        with self.lock:
+            self.durable.notify_all()
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+def round_record(kind: str, r: Round) -> Dict[str, Any]:
+    return {"t": kind, "round": asdict(r)}
+
+
+def recover(journal: Journal, ledger) -> Tuple[Optional[Round], int]:
+    """Снимок + хвост журнала -> ledger. Возвращает последний известный раунд и число применённых записей.
+
+    Время пропорционально хвосту: всё до снимка уже свёрнуто в его балансы.
+    """
+    last: Optional[Round] = None
+    start = 1
+    snap = journal.load_snapshot()
+    if snap is not None:
+        meta = snap.pop("meta")
+        ids = snap.pop("ids")
+        ledger.restore(snap, ids)
+        start = meta["segment"]
+        if meta.get("round"):
+            last = Round(**meta["round"])
+
+    applied = 0
+    for rec in journal.records(start):
+        t = rec["t"]
+        if t == "bet":
+            ledger.place_bet(rec["u"], rec["s"], rec["a"], rec["i"])
+        elif t == "settle":
+            last = Round(**rec["round"])
+            ledger.settle(last)
+            ledger.clear_bets()
+        elif t == "round":
+            last = Round(**rec["round"])
+        applied += 1
+    return last, applied
@@ -1,14 +1,43 @@
-import time
+import json
+import zlib
 import random
-import secrets
-import math
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict
 from typing import Optional, Dict, Any
 
-from fastapi import FastAPI, HTTPException
+import orjson
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
-app = FastAPI(title="TradeBull API", version="0.1.0")
+from .bets import INSURANCE_FEE, BetError, Ledger
+from .candles import CAPACITY, PAGE_LIMIT, CandleHistory
+from . import profiler
+from .game import BET_SEC, POINTS_PER_SEC, RUN_SEC, SERIES_LEN, Round, build_series, get_series, next_round, now_ms
+from .journal import Journal, JournalError, recover, round_record
+from .metrics import REGISTRY, SNAPSHOT, Gauge, MetricsMiddleware
+from .scheduler import LocalRounds, Scheduler
+from .settings import settings
+from .stream import hub, sse
+
+log = logging.getLogger("uvicorn.error")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    hub.start()
+    tasks = [asyncio.create_task(scheduler.run()), asyncio.create_task(broadcaster())]
+    yield
+    for t in tasks:
+        t.cancel()
+    if journal is not None:
+        journal.close()
+
+app = FastAPI(title="TradeBull API", version="0.1.0", lifespan=lifespan)
 
 # ===== CORS =====
 app.add_middleware(
@@ -26,138 +55,176 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-BET_SEC = 7
-RUN_SEC = 30
-
-# ===== in-memory storage (MVP) =====
-users: Dict[str, float] = {}
-bets: Dict[str, Dict[str, Any]] = {}
-last_results: Dict[str, Dict[str, Any]] = {}
-
-def now_ms() -> int:
-    return int(time.time() * 1000)
-
-def new_seed() -> int:
-    return int.from_bytes(secrets.token_bytes(4), "big")
-
-def gen_gold_mult(seed: int) -> int:
-    return (1 + (seed % 7)) if (seed % 100 == 0) else 0
-
-def calc_open_close(seed: int, base: float = 100.0):
-    x = (seed % 2000) / 1000.0
-    delta = (x - 1.0) * 2.0
-    return base, round(base + delta, 3)
-
-def series_points(seed: int, open_p: float, close_p: float, n: int):
-    if n < 2:
-        return [open_p]
-
-    amp = max(0.05, abs(close_p - open_p) * 0.35 + 0.08)
-    pts = []
-    for i in range(n):
-        t = i / (n - 1)
-        base = open_p + (close_p - open_p) * t
-
-        a = (seed % 997) / 997.0
-        b = (seed % 389) / 389.0
-        c = (seed % 127) / 127.0
-
-        w1 = math.sin((t * math.tau) * (2.0 + 6.0 * a) + (seed % 1000) * 0.001)
-        w2 = math.sin((t * math.tau) * (5.0 + 9.0 * b) + (seed % 777) * 0.002)
-        w3 = math.sin((t * math.tau) * (9.0 + 7.0 * c) + (seed % 555) * 0.003)
-
-        noise = (w1 * 0.55 + w2 * 0.30 + w3 * 0.15) * amp
-        pts.append(base + noise)
-
-    pts[0] = open_p
-    pts[-1] = close_p
-    return pts
+STREAM_TICK_SEC = 0.1
+
+# ===== storage =====
+# memory — по умолчанию (один воркер); redis — общее состояние для uvicorn --workers N
+if settings.state_backend == "redis":
+    from .redis import RedisLedger, RedisRounds, connect
+
+    _conn = connect(settings)
+    ledger = RedisLedger(_conn, settings.redis_prefix)
+    rounds = RedisRounds(_conn, settings.redis_prefix)
+else:
+    ledger = Ledger()
+    rounds = LocalRounds()
+
+# журнал: балансы и ставки переживают рестарт (Redis хранит их сам)
+journal: Optional[Journal] = None
+_recovered: Optional[Round] = None
+_settled = 0
+
+_snapshot_busy = threading.Lock()  # одновременно пишется не больше одного снимка
+
+def write_snapshot(cols, ids, meta):
+    try:
+        with SNAPSHOT.time():
+            t0 = time.perf_counter()
+            journal.write_snapshot(cols, ids, meta)
+        log.info("journal snapshot after round %s: %d users, %.1f ms",
+                 meta["round"]["round_id"], len(ids), (time.perf_counter() - t0) * 1000)
+    except Exception:
+        log.exception("journal snapshot failed")
+    finally:
+        _snapshot_busy.release()
+
+def take_snapshot(r: Round):
+    # книга пуста (сразу после расчёта): в раунде остаётся только копия колонок и смена сегмента,
+    # запись на диск — в своём потоке, следующий раунд её не ждёт
+    if not _snapshot_busy.acquire(blocking=False):
+        return  # прошлый ещё пишется — догоним следующим
+    try:
+        cols, ids, segment = ledger.export()
+    except Exception:
+        _snapshot_busy.release()
+        raise
+    threading.Thread(target=write_snapshot, args=(cols, ids, {"segment": segment, "round": asdict(r)}),
+                     name="snapshot", daemon=True).start()
+
+def close_round(r: Round):
+    # зовётся планировщиком в фазе DONE, до публикации следующего раунда
+    global _settled
+    ledger.settle(r)
+    ledger.clear_bets()
+    if journal is not None:
+        _settled += 1
+        if _settled % settings.snapshot_every_rounds == 0:
+            take_snapshot(r)
+
+if settings.journal_dir and settings.state_backend == "memory":
+    journal = Journal(settings.journal_dir, settings.journal_flush_ms)
+    t0 = time.perf_counter()
+    _recovered, applied = recover(journal, ledger)
+    log.info("journal recovered: %d users, %d records, %.1f ms",
+             len(ledger.accounts), applied, (time.perf_counter() - t0) * 1000)
+    journal.open()
+    ledger.journal = journal
+    if _recovered is not None and _recovered.end_ms <= now_ms():
+        # раунд закончился, пока процесс лежал: исход известен заранее — рассчитываем и идём дальше
+        if ledger.bet_count():
+            close_round(_recovered)
+        _recovered = next_round(_recovered)
 
 # ===== round state =====
-state = {
-    "round_id": 1,
-    "phase": "BET",     # BET | RUN | DONE
-    "start_ms": now_ms() + BET_SEC * 1000,
-    "end_ms": now_ms() + (BET_SEC + RUN_SEC) * 1000,
-    "seed": new_seed(),
-    "gold_mult": 0,
-    "open": 100.0,
-    "close": 100.0,
-}
-
-def ensure_user(user_id: str):
-    if user_id not in users:
-        users[user_id] = 10.0
-
-def settle_round():
-    rid = int(state["round_id"])
-    o = float(state["open"])
-    c = float(state["close"])
-    up = c > o
-    gold = int(state.get("gold_mult", 0) or 0)
-
-    for user_id, bet in list(bets.items()):
-        side = bet["side"]
-        amount = float(bet["amount"])
-        insurance = bool(bet.get("insurance", False))
-
-        win = (side == "LONG" and up) or (side == "SHORT" and (not up))
-        payout = 0.0
-
-        if win:
-            payout = amount * 2.0
-            if gold > 0:
-                payout *= gold
-        else:
-            payout = amount * (0.5 if insurance else 0.0)
-
-        users[user_id] += payout
-
-        last_results[user_id] = {
-            "round_id": rid,
-            "win": win,
-            "payout": payout,
-            "gold_mult": gold,
-            "open": o,
-            "close": c,
-            "side": side,
-            "amount": amount,
-            "insurance": insurance,
-        }
-
-def next_round():
-    base = float(state["close"])
-    seed = new_seed()
-    gold = gen_gold_mult(seed)
-    o, c = calc_open_close(seed, base)
-
-    state["round_id"] = int(state["round_id"]) + 1
-    state["phase"] = "BET"
-    state["start_ms"] = now_ms() + BET_SEC * 1000
-    state["end_ms"] = now_ms() + (BET_SEC + RUN_SEC) * 1000
-    state["seed"] = seed
-    state["gold_mult"] = gold
-    state["open"] = o
-    state["close"] = c
-
-    bets.clear()
-
-def ensure_round():
-    t = now_ms()
-
-    if state["phase"] == "BET" and t >= int(state["start_ms"]):
-        state["phase"] = "RUN"
-
-    if state["phase"] == "RUN" and t >= int(state["end_ms"]):
-        state["phase"] = "DONE"
-        settle_round()
-
-    if state["phase"] == "DONE":
-        # даём маленькое окно DONE, чтобы фронт успел увидеть (опционально)
-        # но можно сразу начинать новый раунд
-        next_round()
+history = CandleHistory()
+_prev_round: Optional[Round] = None
+
+def on_round(r: Round):
+    # новый раунд у любого воркера (лидера или ведомого) = предыдущий завершён
+    global _prev_round
+    ledger.on_round(r)
+    if journal is not None:
+        journal.append(round_record("round", r))
+    prev = _prev_round
+    if prev is not None and prev.round_id < r.round_id:
+        s = get_series(prev.round_id)
+        if s is not None:
+            history.add_round(prev, s.candles)
+    _prev_round = r
+
+scheduler = Scheduler(close_round, rounds, on_round=on_round, initial=_recovered)
+
+app.add_middleware(MetricsMiddleware, observe=scheduler.observe)
+
+Gauge("tradebull_active_bets", "Bets in the current round", lambda: ledger.bet_count())
+Gauge("tradebull_stream_subscribers", "Open SSE connections", lambda: len(hub.subs))
+Gauge("tradebull_round_id", "Current round id", lambda: scheduler.round.round_id)
+
+def visible_candles(r: Round, t: int) -> int:
+    # свечи открываются по одной в секунду фазы RUN
+    if r.phase == "BET":
+        return 0
+    if r.phase == "DONE":
+        return RUN_SEC
+    return max(0, min(RUN_SEC, (t - r.start_ms) // 1000))
+
+def visible_points(r: Round, t: int) -> int:
+    # точка открывается каждые 1000 / POINTS_PER_SEC мс фазы RUN
+    if r.phase == "BET":
+        return 0
+    if r.phase == "DONE":
+        return SERIES_LEN
+    return max(0, min(SERIES_LEN, (t - r.start_ms) * POINTS_PER_SEC // 1000 + 1))
+
+def candle_event(r: Round, i: int, c) -> Dict[str, Any]:
+    # time совпадает с /candles?res=10p, так что история и поток склеиваются без зазоров
+    return {"round_id": r.round_id, "i": i, "time": r.start_ms // 1000 + i,
+            "open": c[0], "high": c[1], "low": c[2], "close": c[3]}
+
+# ===== streaming =====
+async def broadcast_round(r0: Round):
+    """Ведёт один раунд: фазы, свечи по мере RUN, итог и расчёт по подписчикам."""
+    rid = r0.round_id
+    candles = get_series(rid).candles
+    hub.publish("round", r0.header(now_ms()))
+    phase = r0.phase
+    sent = 0
+
+    while True:
+        r = scheduler.round
+        if r.round_id != rid:
+            break
+
+        if r.phase != phase:
+            phase = r.phase
+            hub.publish("round", r.header(now_ms()))
+
+        t = now_ms()
+        k = visible_candles(r, t)
+        for i in range(sent, k):
+            hub.publish("candle", candle_event(r0, i, candles[i]))
+        sent = max(sent, k)
+
+        # просыпаемся к следующей свече или к смене фазы
+        timeout = None
+        if r.phase == "RUN" and sent < len(candles):
+            timeout = max(0.0, (r.start_ms + (sent + 1) * 1000 - t) / 1000)
+        elif r.phase == "BET":
+            timeout = max(0.0, (r.start_ms - t) / 1000)
+        await scheduler.wait(timeout)
+
+    # если DONE проскочил между пробуждениями — дошлём хвост свечей и итог раунда
+    for i in range(sent, len(candles)):
+        hub.publish("candle", candle_event(r0, i, candles[i]))
+    if phase != "DONE":
+        hub.publish("round", r0.with_phase("DONE").header(now_ms()))
+
+    # раунд рассчитан: персональные итоги (ledger может ходить в Redis — не в event loop)
+    for user_id, res in await asyncio.to_thread(ledger.results_for, list(hub.by_user), rid):
+        hub.publish("result", res, user_id=user_id)
+
+async def broadcaster():
+    while True:
+        try:
+            await broadcast_round(scheduler.round)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("broadcaster failed")
+            await asyncio.sleep(STREAM_TICK_SEC)
 
 # ===== models =====
 class BetReq(BaseModel):
@@ -172,85 +239,165 @@ def root():
 
 @app.get("/health")
 def health():
-    return {"ok": True}
+    return {"ok": True, "scheduler": scheduler.stats()}
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/debug/profile")
+async def profile(seconds: float = 10.0, interval_ms: float = 5.0):
+    """Снимает профиль всех потоков на seconds секунд (collapsed stacks для flamegraph.pl / speedscope)."""
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    folded = await asyncio.to_thread(profiler.sample, seconds, max(interval_ms, 1.0) / 1000)
+    if folded is None:
+        raise HTTPException(status_code=409, detail="profile already running")
+    return PlainTextResponse(folded, headers={"Content-Disposition": 'attachment; filename="profile.folded"'})
 
 @app.get("/init")
 def init(user_id: str):
-    ensure_user(user_id)
-    return {"user_id": user_id, "balance": users[user_id]}
+    return {"user_id": user_id, "balance": ledger.ensure_user(user_id)}
 
 @app.get("/round")
 def round_state():
-    ensure_round()
-    return {
-        "round_id": int(state["round_id"]),
-        "phase": state["phase"],
-        "server_ms": now_ms(),
-        "start_ms": int(state["start_ms"]),
-        "end_ms": int(state["end_ms"]),
-        "seed": int(state["seed"]),
-        "open": float(state["open"]),
-        "close": float(state["close"]),
-        "gold_mult": int(state.get("gold_mult", 0) or 0),
-        "bet_sec": BET_SEC,
-        "run_sec": RUN_SEC,
-    }
+    return scheduler.round.header(now_ms())
 
 @app.get("/series")
 def series():
-    ensure_round()
-    n = RUN_SEC * 10
-    pts = series_points(int(state["seed"]), float(state["open"]), float(state["close"]), n)
-    return {
-        "round_id": int(state["round_id"]),
-        "phase": state["phase"],
+    r = scheduler.round
+    s = get_series(r.round_id)
+    if s is None:
+        s = build_series(r.round_id, r.seed, r.open, r.close)
+
+    head = json.dumps({
+        "round_id": r.round_id,
+        "phase": r.phase,
         "server_ms": now_ms(),
-        "start_ms": int(state["start_ms"]),
-        "end_ms": int(state["end_ms"]),
-        "gold_mult": int(state.get("gold_mult", 0) or 0),
-        "points": pts,
-    }
+        "start_ms": r.start_ms,
+        "end_ms": r.end_ms,
+        "gold_mult": r.gold_mult,
+    }, separators=(",", ":"))
+    # points уже сериализованы при старте раунда — просто склеиваем
+    body = head[:-1].encode() + b',"points":' + s.points_json + b"}"
+    return Response(content=body, media_type="application/json")
+
+@app.get("/state")
+def state(
+    user_id: str,
+    since: int = 0,
+    round_id: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    """Всё для одного тика клиента: шапка раунда, новые точки после since, ставка и баланс.
+
+    round_id — раунд, к которому относится since; если раунд уже другой, точки отдаются с нуля.
+    """
+    r = scheduler.round
+    t = now_ms()
+    n = visible_points(r, t)
+    if round_id != r.round_id:
+        since = 0
+    since = max(0, min(since, n))
+
+    balance = ledger.ensure_user(user_id)
+    my = ledger.get_bet(user_id)
+
+    # server_ms в ETag не входит: без новых данных клиенту хватает 304 и своих часов
+    sig = f"{r.round_id}:{r.phase}:{since}:{n}:{balance!r}:{my}".encode()
+    etag = f'W/"{zlib.crc32(sig):08x}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    s = get_series(r.round_id)
+    if s is None:
+        s = build_series(r.round_id, r.seed, r.open, r.close)
+    body = orjson.dumps({
+        "round_id": r.round_id,
+        "phase": r.phase,
+        "server_ms": t,
+        "start_ms": r.start_ms,
+        "end_ms": r.end_ms,
+        "gold_mult": r.gold_mult,
+        "bet_sec": BET_SEC,
+        "run_sec": RUN_SEC,
+        "since": since,
+        "next": n,
+        "points": s.points[since:n],
+        "user_id": user_id,
+        "balance": balance,
+        "bet": my,
+    })
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+@app.get("/candles")
+async def candles(
+    res: str = "10p",
+    from_: Optional[int] = Query(None, alias="from"),
+    limit: int = PAGE_LIMIT,
+):
+    """История OHLC завершённых раундов. from — seq свечи (курсор next из прошлой страницы);
+    без from — последние limit свечей. async: читаем буфер в том же потоке, где он пополняется."""
+    if res not in CAPACITY:
+        raise HTTPException(status_code=400, detail=f"res must be one of {', '.join(CAPACITY)}")
+    return Response(content=orjson.dumps(history.page(res, from_, limit)), media_type="application/json")
 
 @app.post("/bet")
 def bet(req: BetReq):
-    ensure_round()
-    if state["phase"] != "BET":
+    r = scheduler.round
+    if r.phase != "BET":
         raise HTTPException(status_code=400, detail="Betting closed (phase is not BET)")
 
-    ensure_user(req.user_id)
-
     if req.side not in ("LONG", "SHORT"):
         raise HTTPException(status_code=400, detail="side must be LONG or SHORT")
     if req.amount <= 0:
         raise HTTPException(status_code=400, detail="amount must be > 0")
 
-    insurance_fee = 0.5 if req.insurance else 0.0
-    total_cost = float(req.amount) + insurance_fee
-
-    if users[req.user_id] < total_cost:
-        raise HTTPException(status_code=400, detail="Not enough balance")
-
-    users[req.user_id] -= total_cost
-
-    bets[req.user_id] = {
-        "side": req.side,
-        "amount": float(req.amount),
-        "insurance": bool(req.insurance),
-    }
+    insurance_fee = INSURANCE_FEE if req.insurance else 0.0
+    try:
+        balance = ledger.place_bet(req.user_id, req.side, req.amount, bool(req.insurance))
+    except BetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JournalError:
+        raise HTTPException(status_code=503, detail="Bet could not be saved")
 
-    return {
+    resp = {
         "ok": True,
-        "round_id": int(state["round_id"]),
-        "balance": users[req.user_id],
-        "bet": bets[req.user_id],
+        "round_id": r.round_id,
+        "balance": balance,
+        "bet": ledger.get_bet(req.user_id),
         "insurance_fee": insurance_fee,
     }
+    hub.publish("bet", {"round_id": resp["round_id"], "bet": resp["bet"], "balance": resp["balance"]}, user_id=req.user_id)
+    return resp
 
 @app.get("/mybet")
 def mybet(user_id: str):
-    ensure_round()
-    return {"round_id": int(state["round_id"]), "bet": bets.get(user_id)}
+    return {"round_id": scheduler.round.round_id, "bet": ledger.get_bet(user_id)}
 
 @app.get("/last_result")
 def last_result(user_id: str):
-    return {"result": last_results.get(user_id)}
+    return {"result": ledger.last_result(user_id)}
+
+@app.get("/stream")
+async def stream(user_id: str):
+    """SSE: round / candle / bet / result / balance вместо опроса /init + /series + /mybet."""
+    balance = await asyncio.to_thread(ledger.ensure_user, user_id)
+    my = await asyncio.to_thread(ledger.get_bet, user_id)
+    r = scheduler.round
+    rid = r.round_id
+
+    sub = hub.subscribe(user_id)
+    sub.push(sse("balance", {"user_id": user_id, "balance": balance}))
+    sub.push(sse("round", r.header(now_ms())))
+    candles = get_series(rid).candles
+    for i in range(visible_candles(r, now_ms())):
+        sub.push(sse("candle", candle_event(r, i, candles[i])))
+    if my is not None:
+        sub.push(sse("bet", {"round_id": rid, "bet": my, "balance": balance}))
+
+    return StreamingResponse(
+        hub.events(sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,238 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+
+class Reservoir:
+    """Последние N замеров (мс) и перцентили по ним."""
+
+    def __init__(self, size: int = 2048):
+        self.values: Deque[float] = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, v: float):
+        self.values.append(v)
+        self.count += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.values:
+            return None
+        xs = sorted(self.values)
+        return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.count,
+            "p50": self.percentile(0.50),
+            "p99": self.percentile(0.99),
+            "max": max(self.values) if self.values else None,
+        }
+
+
+# ===== Prometheus =====
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, by: float = 1.0):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + by
+
+    def render(self) -> List[str]:
+        out = self.header()
+        for lv, v in sorted(self.values.items()):
+            out.append(f"{self.name}{_labels(self.label_names, lv)} {_num(v)}")
+        return out
+
+
+class Gauge(_Metric):
+    """Значение снимается в момент /metrics вызовом fn()."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            v = self.fn()
+        except Exception:
+            return []
+        return self.header() + [f"{self.name} {_num(v)}"]
+
+
+class CounterFn(Gauge):
+    """Монотонный счётчик, который ведёт кто-то другой (ОС и т.п.); снимается fn()."""
+
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.values: Dict[Tuple[str, ...], List[float]] = {}  # [count по бакетам..., +Inf, sum]
+
+    def observe(self, v: float, *labels: str):
+        i = bisect_left(self.buckets, v)
+        with self.lock:
+            row = self.values.get(labels)
+            if row is None:
+                row = self.values[labels] = [0.0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += v
+
+    @contextmanager
+    def time(self, *labels: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def render(self) -> List[str]:
+        out = self.header()
+        with self.lock:
+            rows = sorted((k, list(v)) for k, v in self.values.items())
+        for lv, row in rows:
+            acc = 0.0
+            for le, n in zip(self.buckets + (float("inf"),), row):
+                acc += n
+                le_s = "+Inf" if le == float("inf") else repr(le)
+                extra = 'le="' + le_s + '"'
+                out.append(f"{self.name}_bucket{_labels(self.label_names, lv, extra)} {_num(acc)}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, lv)} {row[-1]!r}")
+            out.append(f"{self.name}_count{_labels(self.label_names, lv)} {_num(acc)}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.enabled = True  # выключатель для замера накладных расходов
+
+    def register(self, m: _Metric):
+        self.metrics.append(m)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self.metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = Counter("tradebull_http_requests_total", "HTTP requests", ("route", "method", "status"))
+HTTP_LATENCY = Histogram(
+    "tradebull_http_request_duration_seconds",
+    "Time to response start (for /stream: until the stream opens)",
+    ("route", "method"),
+)
+BOUNDARY_LATENCY = Histogram(
+    "tradebull_boundary_request_duration_seconds",
+    "Request latency within 1 s of a round phase change",
+)
+SERIES_BUILD = Histogram("tradebull_series_build_seconds", "Building a round price series")
+SETTLE = Histogram(
+    "tradebull_settle_seconds", "Settling a round",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+SNAPSHOT = Histogram(
+    "tradebull_snapshot_seconds", "Writing a journal snapshot (background thread, not part of settlement)",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+ROUND_DRIFT = Histogram(
+    "tradebull_round_drift_seconds", "Phase change time minus planned start_ms/end_ms",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except OSError:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+Gauge("process_resident_memory_bytes", "Resident memory size in bytes", rss_bytes)
+CounterFn("process_cpu_seconds_total", "User and system CPU time in seconds", lambda: sum(os.times()[:2]))
+
+
+class MetricsMiddleware:
+    """ASGI-мидлварь: счётчик и гистограмма по шаблону маршрута (а не сырому пути)."""
+
+    def __init__(self, app, observe: Optional[Callable[[float, int], None]] = None):
+        self.app = app
+        self.observe = observe
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not REGISTRY.enabled:
+            return await self.app(scope, receive, send)
+
+        started_ms = int(time.time() * 1000)
+        t0 = time.perf_counter()
+        status = 500
+        elapsed = None
+
+        async def send_wrapper(msg):
+            nonlocal status, elapsed
+            if msg["type"] == "http.response.start":
+                status = msg["status"]
+                elapsed = time.perf_counter() - t0
+            await send(msg)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if elapsed is None:
+                elapsed = time.perf_counter() - t0
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.inc(path, scope["method"], str(status))
+            HTTP_LATENCY.observe(elapsed, path, scope["method"])
+            if self.observe is not None:
+                self.observe(elapsed * 1000, started_ms)
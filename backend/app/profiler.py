@@ -0,0 +1,44 @@
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+MAX_SECONDS = 60.0
+
+_busy = threading.Lock()  # одновременно — только один профиль
+
+
+def _stack(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def sample(seconds: float, interval: float = 0.005) -> Optional[str]:
+    """Сэмплирует стеки всех потоков seconds секунд.
+
+    Возвращает collapsed stacks ("thread;f1;f2 N" построчно) — формат
+    flamegraph.pl / speedscope / inferno. None, если профиль уже снимается.
+    """
+    if not _busy.acquire(blocking=False):
+        return None
+    try:
+        me = threading.get_ident()
+        names = {}
+        counts: Counter = Counter()
+        deadline = time.perf_counter() + min(seconds, MAX_SECONDS)
+        while time.perf_counter() < deadline:
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                if tid not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                counts[names.get(tid, str(tid)) + ";" + _stack(frame)] += 1
+            time.sleep(interval)
+        return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+    finally:
+        _busy.release()
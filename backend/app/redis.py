@@ -0,0 +1,231 @@
+import json
+import os
+import uuid
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .bets import INSURANCE_FEE, SIDES, START_BALANCE, BetError, compute_payouts
+from .game import Round
+from .settings import Settings
+
+LEADER_TTL_MS = 10_000
+BETS_TTL_MS = 3600 * 1000  # книга раунда не должна пережить сбой лидера навсегда
+SETTLE_CHUNK = 5000  # ставок в одном вызове SETTLE
+RESULTS_CHUNK = 5000  # полей в одном HMGET
+
+# проверка окна ставок + баланса, списание и запись ставки за один round trip;
+# окно — по общему раунду в Redis, а не по снимку воркера, который может отставать
+PLACE_BET = """
+if redis.call('GET', KEYS[3]) ~= ARGV[6] then
+  return {-1, '0'}
+end
+local bal = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or ARGV[3])
+local cost = tonumber(ARGV[2])
+if bal < cost then
+  return {0, string.format('%.17g', bal)}
+end
+bal = bal - cost
+redis.call('HSET', KEYS[1], ARGV[1], string.format('%.17g', bal))
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[4])
+redis.call('PEXPIRE', KEYS[2], ARGV[5])
+return {1, string.format('%.17g', bal)}
+"""
+
+# выплата по ставкам раунда: каждая ставка снимается из книги в том же скрипте,
+# так что повторный расчёт (новый лидер подхватил DONE, отставший лидер проснулся)
+# платит только по тем, что ещё не рассчитаны
+SETTLE = """
+local paid = 0
+for i = 1, #ARGV, 3 do
+  if redis.call('HDEL', KEYS[3], ARGV[i]) == 1 then
+    if tonumber(ARGV[i + 1]) ~= 0 then
+      redis.call('HINCRBYFLOAT', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 2])
+    paid = paid + 1
+  end
+end
+return paid
+"""
+
+# записать раунд, только если лидер всё ещё мы; KEYS[3] — id раунда, принимающего ставки
+SAVE_ROUND = """
+if redis.call('GET', KEYS[2]) ~= ARGV[1] then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[2])
+if ARGV[4] == 'BET' then
+  redis.call('SET', KEYS[3], ARGV[3])
+else
+  redis.call('DEL', KEYS[3])
+end
+return 1
+"""
+
+# продлить лидерство, только если ключ всё ещё наш
+RENEW_LEADER = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class _RedisPy:
+    """redis-py под интерфейс upstash_redis (eval(script, keys, args))."""
+
+    def __init__(self, r):
+        self.r = r  # redis.Redis (или fakeredis.FakeRedis) с decode_responses=True
+        self._scripts: Dict[str, Any] = {}
+
+    def eval(self, script, keys=None, args=None):
+        fn = self._scripts.get(script)
+        if fn is None:
+            fn = self._scripts[script] = self.r.register_script(script)  # дальше EVALSHA
+        return fn(keys=keys or [], args=args or [])
+
+    def __getattr__(self, name):
+        return getattr(self.r, name)
+
+
+def connect(s: Settings):
+    if s.redis_url:
+        import redis
+
+        return _RedisPy(redis.Redis.from_url(s.redis_url, decode_responses=True))
+    from upstash_redis import Redis
+
+    return Redis(url=s.upstash_redis_rest_url, token=s.upstash_redis_rest_token.get_secret_value())
+
+
+class RedisLedger:
+    """Ledger поверх Redis: балансы, ставки раунда и последние итоги общие для всех воркеров."""
+
+    def __init__(self, conn, prefix: str = "tb:"):
+        self.conn = conn
+        self.p = prefix
+        self.round_id = 0
+        # итоги меняются только при расчёте — кэшируем в воркере до смены раунда
+        self._last: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    def _bets(self, round_id: int) -> str:
+        return f"{self.p}bets:{round_id}"
+
+    def on_round(self, r: Round):
+        if r.round_id != self.round_id:
+            self.round_id = r.round_id
+            self._last = {}
+
+    def ensure_user(self, user_id: str) -> float:
+        # пользователь без записи в хеше — это новый пользователь со стартовым балансом
+        return self.balance(user_id)
+
+    def bet_count(self) -> int:
+        return int(self.conn.hlen(self._bets(self.round_id)))
+
+    def balance(self, user_id: str) -> float:
+        v = self.conn.hget(f"{self.p}bal", user_id)
+        return START_BALANCE if v is None else float(v)
+
+    def get_bet(self, user_id: str) -> Optional[Dict[str, Any]]:
+        v = self.conn.hget(self._bets(self.round_id), user_id)
+        return None if v is None else json.loads(v)
+
+    def last_result(self, user_id: str) -> Optional[Dict[str, Any]]:
+        if user_id not in self._last:
+            v = self.conn.hget(f"{self.p}last", user_id)
+            self._last[user_id] = None if v is None else json.loads(v)
+        return self._last[user_id]
+
+    def results_for(self, user_ids: List[str], round_id: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """Итоги раунда для подписчиков: два HMGET на пачку вместо двух HGET на пользователя."""
+        out = []
+        for lo in range(0, len(user_ids), RESULTS_CHUNK):
+            ids = user_ids[lo:lo + RESULTS_CHUNK]
+            lasts = self.conn.hmget(f"{self.p}last", *ids)
+            bals = self.conn.hmget(f"{self.p}bal", *ids)
+            for user_id, last, bal in zip(ids, lasts, bals):
+                res = None if last is None else json.loads(last)
+                self._last[user_id] = res
+                if res is not None and res["round_id"] == round_id:
+                    out.append((user_id, {**res, "balance": START_BALANCE if bal is None else float(bal)}))
+        return out
+
+    def place_bet(self, user_id: str, side: str, amount: float, insurance: bool) -> float:
+        total_cost = float(amount) + (INSURANCE_FEE if insurance else 0.0)
+        bet = json.dumps({"side": side, "amount": float(amount), "insurance": bool(insurance)})
+        ok, bal = self.conn.eval(
+            PLACE_BET,
+            keys=[f"{self.p}bal", self._bets(self.round_id), f"{self.p}open"],
+            args=[user_id, repr(total_cost), repr(START_BALANCE), bet, str(BETS_TTL_MS), str(self.round_id)],
+        )
+        if int(ok) < 0:
+            raise BetError("Betting closed (phase is not BET)")
+        if not int(ok):
+            raise BetError("Not enough balance")
+        return float(bal)
+
+    def settle(self, r: Round):
+        raw = self.conn.hgetall(self._bets(r.round_id))
+        if not raw:
+            return
+        uids = list(raw)
+        book = [json.loads(raw[u]) for u in uids]
+        side = np.array([SIDES.index(b["side"]) for b in book], dtype=np.int8)
+        amount = np.array([b["amount"] for b in book], dtype=np.float64)
+        insurance = np.array([b["insurance"] for b in book], dtype=np.bool_)
+
+        win, payout = compute_payouts(side, amount, insurance, r.close > r.open, r.gold_mult)
+
+        keys = [f"{self.p}bal", f"{self.p}last", self._bets(r.round_id)]
+        for lo in range(0, len(uids), SETTLE_CHUNK):
+            args = []
+            for k in range(lo, min(lo + SETTLE_CHUNK, len(uids))):
+                pay = float(payout[k])
+                args += [uids[k], repr(pay), json.dumps({
+                    "round_id": r.round_id,
+                    "win": bool(win[k]),
+                    "payout": pay,
+                    "gold_mult": r.gold_mult,
+                    "open": r.open,
+                    "close": r.close,
+                    "side": book[k]["side"],
+                    "amount": book[k]["amount"],
+                    "insurance": book[k]["insurance"],
+                })]
+            self.conn.eval(SETTLE, keys=keys, args=args)
+        self._last = {}
+
+    def clear_bets(self):
+        self.conn.delete(self._bets(self.round_id))
+
+
+class RedisRounds:
+    """Текущий раунд в Redis + выбор лидера: таймеры двигает только один воркер."""
+
+    shared = True
+
+    def __init__(self, conn, prefix: str = "tb:"):
+        self.conn = conn
+        self.key = f"{prefix}round"
+        self.leader_key = f"{prefix}leader"
+        self.open_key = f"{prefix}open"
+        self.me = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def load(self) -> Optional[Round]:
+        v = self.conn.get(self.key)
+        return None if v is None else Round(**json.loads(v))
+
+    def save(self, r: Round) -> bool:
+        return bool(int(self.conn.eval(
+            SAVE_ROUND,
+            keys=[self.key, self.leader_key, self.open_key],
+            args=[self.me, json.dumps(asdict(r)), str(r.round_id), r.phase],
+        )))
+
+    def lead(self) -> bool:
+        if self.conn.set(self.leader_key, self.me, nx=True, px=LEADER_TTL_MS):
+            return True
+        return bool(int(self.conn.eval(RENEW_LEADER, keys=[self.leader_key], args=[self.me, str(LEADER_TTL_MS)])))
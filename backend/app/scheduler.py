@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Optional, Tuple
+
+from .game import Round, build_series, first_round, get_series, next_round, now_ms
+from .metrics import BOUNDARY_LATENCY, ROUND_DRIFT, SETTLE, Reservoir
+
+# запросы в пределах этого окна от смены фазы считаем пришедшими «на границе раунда»
+BOUNDARY_WINDOW_MS = 1000
+# лидер спит кусками не длиннее этого, продлевая лидерство; ведомые опрашивают общий раунд
+LEAD_RENEW_SEC = 2.0
+FOLLOW_POLL_SEC = 0.25
+
+log = logging.getLogger("uvicorn.error")
+
+
+class LocalRounds:
+    """Раунд живёт только в этом процессе: один воркер, он же всегда лидер."""
+
+    shared = False
+
+    def load(self) -> Optional[Round]:
+        return None
+
+    def save(self, r: Round) -> bool:
+        return True
+
+    def lead(self) -> bool:
+        return True
+
+
+class Scheduler:
+    """Двигает раунд по таймерам: BET -> RUN -> DONE (расчёт) -> следующий BET.
+
+    Текущий раунд лежит в self.round как неизменяемый снимок; хендлеры читают
+    его без блокировок, планировщик только подменяет ссылку.
+    """
+
+    def __init__(self, close_round: Callable[[Round], None], rounds=None,
+                 on_round: Optional[Callable[[Round], None]] = None,
+                 initial: Optional[Round] = None):
+        self.close_round = close_round
+        self.rounds = rounds or LocalRounds()
+        self.on_round = on_round
+        # initial — раунд, восстановленный из журнала; иначе начинаем с нуля
+        if initial is not None and get_series(initial.round_id) is None:
+            build_series(initial.round_id, initial.seed, initial.open, initial.close)
+        self.round: Round = initial or first_round()
+        self._changed = asyncio.Event()
+        self.last_boundary_ms = now_ms()
+        self.leader = False
+
+        self.drift = Reservoir(256)             # факт смены фазы минус план, мс
+        self.settle = Reservoir(256)            # длительность расчёта, мс
+        self.settled: Deque[Tuple[int, float]] = deque(maxlen=256)  # (round_id, мс) — для отчётов по прогонам
+        self.latency = Reservoir()              # все запросы, мс
+        self.boundary_latency = Reservoir()     # запросы около смены фазы, мс
+
+        if self.on_round is not None:
+            self.on_round(self.round)
+
+    async def _io(self, fn, *args):
+        # общий стор (Redis) ходит в сеть — не блокируем event loop
+        if self.rounds.shared:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def run(self):
+        while True:
+            try:
+                leader = await self._io(self.rounds.lead)
+                if leader and not self.leader:
+                    # стали лидером: продолжаем общий раунд, если он есть
+                    stored = await self._io(self.rounds.load)
+                    if stored is not None and stored.round_id >= self.round.round_id:
+                        self._adopt(stored)
+                    else:
+                        await self._io(self.rounds.save, self.round)
+                self.leader = leader
+                if leader:
+                    await self._lead_step()
+                else:
+                    await self._follow_step()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("scheduler step failed")
+                await asyncio.sleep(1)
+
+    async def _lead_step(self):
+        r = self.round
+        if r.phase == "BET":
+            if await self._sleep_until(r.start_ms):
+                await self._publish(r.with_phase("RUN"), r.start_ms)
+        elif r.phase == "RUN":
+            if await self._sleep_until(r.end_ms):
+                await self._publish(r.with_phase("DONE"), r.end_ms)
+        else:
+            # лидерство могло истечь, пока спали или считали: расчёт и следующий раунд — только лидеру
+            if not await self._io(self.rounds.lead):
+                self.leader = False
+                return
+            t0 = time.perf_counter()
+            try:
+                # расчёт в отдельном потоке: event loop и хендлеры не ждут
+                await asyncio.to_thread(self.close_round, r)
+            except Exception:
+                log.exception("settlement failed for round %s", r.round_id)
+            dt = time.perf_counter() - t0
+            self.settle.add(dt * 1000)
+            self.settled.append((r.round_id, dt * 1000))
+            SETTLE.observe(dt)
+            await self._publish(next_round(r))
+
+    async def _follow_step(self):
+        stored = await self._io(self.rounds.load)
+        if stored is not None and stored != self.round and stored.round_id >= self.round.round_id:
+            self._adopt(stored)
+        await asyncio.sleep(FOLLOW_POLL_SEC)
+
+    async def _sleep_until(self, ms: int) -> bool:
+        """Спит до ms; False — если по дороге потеряли лидерство."""
+        while True:
+            delay = (ms - now_ms()) / 1000
+            if delay <= 0:
+                return True
+            await asyncio.sleep(min(delay, LEAD_RENEW_SEC) if self.rounds.shared else delay)
+            if not await self._io(self.rounds.lead):
+                self.leader = False
+                return False
+
+    async def _publish(self, r: Round, planned_ms: Optional[int] = None):
+        # save() атомарно проверяет лидерство: отставший лидер не перетрёт раунд нового
+        if not await self._io(self.rounds.save, r):
+            self.leader = False
+            return
+        self._advance(r, planned_ms)
+
+    def _adopt(self, r: Round):
+        if get_series(r.round_id) is None:
+            build_series(r.round_id, r.seed, r.open, r.close)
+        self._advance(r)
+
+    def _advance(self, r: Round, planned_ms: Optional[int] = None):
+        t = now_ms()
+        if planned_ms is not None:
+            self.drift.add(t - planned_ms)
+            ROUND_DRIFT.observe((t - planned_ms) / 1000)
+        new_round = r.round_id != self.round.round_id
+        self.round = r
+        self.last_boundary_ms = t
+        if new_round and self.on_round is not None:
+            # сброс кэшей воркера, история свечей и т.п.; ошибка тут не должна стопорить раунды
+            try:
+                self.on_round(r)
+            except Exception:
+                log.exception("on_round failed for round %s", r.round_id)
+        ev, self._changed = self._changed, asyncio.Event()
+        ev.set()
+
+    async def wait(self, timeout: Optional[float] = None):
+        """Ждёт следующей смены снимка (или таймаута)."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def observe(self, latency_ms: float, started_ms: int):
+        self.latency.add(latency_ms)
+        r = self.round
+        upcoming = r.start_ms if r.phase == "BET" else r.end_ms
+        if min(abs(started_ms - self.last_boundary_ms), abs(upcoming - started_ms)) <= BOUNDARY_WINDOW_MS:
+            self.boundary_latency.add(latency_ms)
+            BOUNDARY_LATENCY.observe(latency_ms / 1000)
+
+    def stats(self) -> dict:
+        return {
+            "round_id": self.round.round_id,
+            "phase": self.round.phase,
+            "leader": self.leader,
+            "drift_ms": self.drift.summary(),
+            "settle_ms": self.settle.summary(),
+            "settled": [[rid, ms] for rid, ms in self.settled],
+            "latency_ms": self.latency.summary(),
+            "boundary_latency_ms": self.boundary_latency.summary(),
+        }
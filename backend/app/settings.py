@@ -0,0 +1,28 @@
+from typing import Literal
+
+from pydantic import Field, PositiveInt, SecretStr
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    # memory — всё в процессе (один воркер), redis — общее состояние для нескольких воркеров
+    state_backend: Literal["memory", "redis"] = "memory"
+
+    # redis://… — обычный Redis (локально, в бенчмарках); иначе Upstash REST
+    redis_url: str = ""
+    upstash_redis_rest_url: str = ""
+    upstash_redis_rest_token: SecretStr = SecretStr("")
+    redis_prefix: str = "tb:"
+
+    # POST /debug/profile — сэмплирующий профайлер; по умолчанию выключен
+    profiling_enabled: bool = False
+
+    # журнал ставок и расчётов на диске (только memory); пусто — выключен
+    journal_dir: str = ""
+    journal_flush_ms: float = Field(2.0, ge=0)
+    snapshot_every_rounds: PositiveInt = 20
+
+
+settings = Settings()
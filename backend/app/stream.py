@@ -0,0 +1,88 @@
+import asyncio
+import json
+from typing import Any, Dict, Optional, Set
+
+# сколько событий держим на одно соединение; медленный клиент теряет самые старые
+STREAM_QUEUE_SIZE = 64
+KEEPALIVE_SEC = 15.0
+
+
+def sse(event: str, data: Dict[str, Any]) -> bytes:
+    """Одно SSE-сообщение, сериализуется один раз на всех подписчиков."""
+    return b"event: " + event.encode() + b"\ndata: " + json.dumps(data, separators=(",", ":")).encode() + b"\n\n"
+
+
+class Subscriber:
+    __slots__ = ("user_id", "queue", "dropped")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self.dropped = 0
+
+    def push(self, msg: bytes):
+        if self.queue.full():
+            # не ждём медленного клиента: выкидываем самое старое событие
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(msg)
+
+
+class Hub:
+    def __init__(self):
+        self.subs: Set[Subscriber] = set()
+        self.by_user: Dict[str, Set[Subscriber]] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+
+    def subscribe(self, user_id: str) -> Subscriber:
+        sub = Subscriber(user_id)
+        self.subs.add(sub)
+        self.by_user.setdefault(user_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subs.discard(sub)
+        peers = self.by_user.get(sub.user_id)
+        if peers is not None:
+            peers.discard(sub)
+            if not peers:
+                del self.by_user[sub.user_id]
+
+    def _fanout(self, msg: bytes, user_id: Optional[str]):
+        targets = self.subs if user_id is None else self.by_user.get(user_id, ())
+        for sub in list(targets):
+            sub.push(msg)
+
+    def publish(self, event: str, data: Dict[str, Any], user_id: Optional[str] = None):
+        """Рассылает событие всем (или только соединениям user_id).
+
+        Можно звать и из потоков threadpool (sync-хендлеры FastAPI) —
+        тогда рассылка переносится в event loop.
+        """
+        if self.loop is None:
+            return
+        msg = sse(event, data)
+        try:
+            in_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            self._fanout(msg, user_id)
+        else:
+            self.loop.call_soon_threadsafe(self._fanout, msg, user_id)
+
+    async def events(self, sub: Subscriber):
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(sub.queue.get(), KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+
+hub = Hub()
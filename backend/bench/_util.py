@@ -0,0 +1,54 @@
+"""Общее для бенчмарков: перцентиль, свободный порт, локальный uvicorn и fakeredis."""
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(xs: List[float], q: float) -> Optional[float]:
+    if not xs:
+        return None
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_uvicorn(workers: int = 1, env: Optional[Dict[str, str]] = None) -> Tuple[subprocess.Popen, str]:
+    """Поднимает backend.app.main:app на свободном порту и ждёт /health; env дополняет окружение."""
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=dict(os.environ, **(env or {})),
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(150):
+        try:
+            httpx.get(base + "/health", timeout=0.5)
+            return proc, base
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def start_fake_redis() -> str:
+    """fakeredis TcpFakeServer в фоне: однопоточный, годится для проверки, а не для цифр."""
+    from fakeredis import TcpFakeServer
+
+    port = free_port()
+    srv = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0"
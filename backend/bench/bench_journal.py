@@ -0,0 +1,147 @@
+"""Журнал ставок: цена durability для /bet и время восстановления после рестарта.
+
+1. Ledger.place_bet из N потоков (как хендлер /bet в пуле FastAPI) без журнала
+   и с журналом: p50/p99 на ставку, пропускная способность, записей на fsync.
+2. Восстановление: снимок на --users пользователей + хвост журнала разной
+   длины; проверяет, что балансы совпадают с исходным Ledger.
+
+Запуск из корня репозитория:
+    python -m backend.bench.bench_journal [--threads 1,8,32] [--users 1000000] [--dir /tmp/tb-journal]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from backend.app.bets import Ledger
+from backend.app.game import Round
+from backend.app.journal import Journal, recover, round_record
+from backend.bench._util import percentile
+
+
+def bet_latency(path: Optional[str], threads: int, per_thread: int, flush_ms: float):
+    ledger = Ledger()
+    journal = None
+    if path is not None:
+        shutil.rmtree(path, ignore_errors=True)
+        journal = Journal(path, flush_ms)
+        journal.open()
+        ledger.journal = journal
+
+    lat: List[float] = []
+    lock = threading.Lock()
+
+    def worker(t: int):
+        rnd = random.Random(t)
+        mine = []
+        for k in range(per_thread):
+            uid = f"t{t}-{k}"
+            t0 = time.perf_counter()
+            ledger.place_bet(uid, rnd.choice(("LONG", "SHORT")), 0.1, rnd.random() < 0.2)
+            mine.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            lat.extend(mine)
+
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    t0 = time.perf_counter()
+    for th in pool:
+        th.start()
+    for th in pool:
+        th.join()
+    wall = time.perf_counter() - t0
+
+    per_fsync = None
+    if journal is not None:
+        per_fsync = len(lat) / max(1, journal.fsyncs)
+        journal.close()
+    return percentile(lat, 0.50), percentile(lat, 0.99), len(lat) / wall, per_fsync
+
+
+def build_state(path: str, users: int, tail: int):
+    """Ledger на users пользователей со снимком, затем tail ставок (и расчёт) только в журнале."""
+    shutil.rmtree(path, ignore_errors=True)
+    rnd = np.random.default_rng(users + tail)
+    ledger = Ledger()
+    ids = [f"u{k}" for k in range(users)]
+    ledger.restore({"balance": rnd.uniform(1, 50, users)} | {
+        name: np.zeros(users, dtype=getattr(ledger.accounts, name).dtype)
+        for name in ledger.accounts.COLUMNS if name != "balance"
+    }, ids)
+
+    journal = Journal(path, flush_ms=1.0)
+    journal.open()
+    r = Round(round_id=1, phase="DONE", start_ms=0, end_ms=0, seed=0, gold_mult=0, open=100.0, close=100.5)
+    cols, snap_ids, _ = ledger.export()
+    segment = journal.rotate()
+    t0 = time.perf_counter()
+    journal.write_snapshot(cols, snap_ids, {"segment": segment, "round": None})
+    t_snap = time.perf_counter() - t0
+
+    # хвост пишем в журнал напрямую (без wait() на каждую ставку) и применяем к эталону
+    journal.append(round_record("round", r))
+    for k in (rnd.choice(users, size=tail, replace=False) if tail else []):
+        journal.append({"t": "bet", "u": ids[k], "s": "LONG", "a": 0.1, "i": False})
+        ledger.place_bet(ids[k], "LONG", 0.1, False)
+    if tail:
+        journal.append(round_record("settle", r))
+        ledger.settle(r)
+        ledger.clear_bets()
+    journal.close()
+    return ledger, t_snap
+
+
+def run_recovery(path: str, users: int, tail: int):
+    original, t_snap = build_state(path, users, tail)
+    fresh = Ledger()
+    journal = Journal(path)
+    t0 = time.perf_counter()
+    _, applied = recover(journal, fresh)
+    t_rec = time.perf_counter() - t0
+
+    n = len(original.accounts)
+    assert fresh.accounts.ids == original.accounts.ids
+    assert np.array_equal(fresh.accounts.balance[:n], original.accounts.balance[:n])
+    assert np.array_equal(fresh.accounts.last_round[:n], original.accounts.last_round[:n])
+    size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return t_snap, t_rec, applied, size
+
+
+def main_():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", default="1,8,32")
+    ap.add_argument("--bets", type=int, default=4000, help="ставок на прогон")
+    ap.add_argument("--flush-ms", type=float, default=2.0)
+    ap.add_argument("--users", type=int, default=1_000_000)
+    ap.add_argument("--tails", default="0,10000,100000")
+    ap.add_argument("--dir", default="", help="каталог журнала (по умолчанию временный)")
+    args = ap.parse_args()
+
+    base = args.dir or tempfile.mkdtemp(prefix="tb-journal-")
+    path = os.path.join(base, "journal")
+    try:
+        print(f"{'threads':>7} {'journal':<8}{'p50 ms':>9}{'p99 ms':>9}{'bets/s':>10}{'bets/fsync':>12}")
+        for n in [int(x) for x in args.threads.split(",")]:
+            per = max(1, args.bets // n)
+            for label, p in (("off", None), ("on", path)):
+                p50, p99, rate, per_fsync = bet_latency(p, n, per, args.flush_ms)
+                extra = f"{per_fsync:>12.1f}" if per_fsync is not None else f"{'—':>12}"
+                print(f"{n:>7} {label:<8}{p50:>9.3f}{p99:>9.3f}{rate:>10.0f}{extra}")
+
+        print()
+        print(f"{'users':>9}{'tail':>8}{'snapshot ms':>13}{'recover ms':>12}{'records':>9}{'disk MB':>9}")
+        for tail in [int(x) for x in args.tails.split(",")]:
+            t_snap, t_rec, applied, size = run_recovery(path, args.users, tail)
+            print(f"{args.users:>9}{tail:>8}{t_snap * 1e3:>13.1f}{t_rec * 1e3:>12.1f}{applied:>9}{size / 2**20:>9.1f}")
+    finally:
+        if not args.dir:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main_()
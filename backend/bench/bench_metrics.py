@@ -0,0 +1,63 @@
+"""Накладные расходы метрик: req/s с MetricsMiddleware и без (REGISTRY.enabled).
+
+Приложение вызывается напрямую через ASGI, без сети, так что доля мидлвари
+видна в чистом виде. Короткие прогоны чередуются, берётся медиана из --repeat.
+Запуск из корня репозитория:
+    python -m backend.bench.bench_metrics [--requests 500 --repeat 40]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from backend.app import main
+from backend.app.metrics import HTTP_LATENCY, REGISTRY
+
+PATHS = ("/round", "/mybet?user_id=bench", "/state?user_id=bench")
+
+
+async def rps(http: httpx.AsyncClient, n: int) -> float:
+    t0 = time.perf_counter()
+    for k in range(n):
+        await http.get(PATHS[k % len(PATHS)])
+    return n / (time.perf_counter() - t0)
+
+
+async def run(n: int, repeat: int):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        await rps(http, 200)
+        runs = {True: [], False: []}
+        for _ in range(repeat):
+            for enabled in (False, True):
+                REGISTRY.enabled = enabled
+                runs[enabled].append(await rps(http, n))
+        REGISTRY.enabled = True
+    return statistics.median(runs[False]), statistics.median(runs[True])
+
+
+def main_():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=500, help="запросов в одном прогоне")
+    ap.add_argument("--repeat", type=int, default=40)
+    args = ap.parse_args()
+
+    off, on = asyncio.run(run(args.requests, args.repeat))
+    print(f"metrics off: {off:8.0f} req/s")
+    print(f"metrics on:  {on:8.0f} req/s  (overhead {(off - on) / off * 100:.1f}%, {(1 / on - 1 / off) * 1e6:.1f} us/request)")
+
+    t0 = time.perf_counter()
+    for _ in range(100_000):
+        HTTP_LATENCY.observe(0.001, "/bench", "GET")
+    print(f"histogram observe: {(time.perf_counter() - t0) / 100_000 * 1e6:.2f} us")
+
+    t0 = time.perf_counter()
+    for _ in range(100):
+        REGISTRY.render()
+    print(f"/metrics render: {(time.perf_counter() - t0) / 100 * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,109 @@
+"""Микробенчмарк /series: старый путь (пересчёт 300 точек на каждый запрос) vs кэш раунда.
+
+Сначала проверяет, что series_points совпадает с прежним циклом точка в точку.
+Запуск из корня репозитория:
+    python -m backend.bench.bench_series [--requests 3000] [--seeds 3000]
+"""
+import argparse
+import math
+import random
+import time
+
+from fastapi.testclient import TestClient
+
+from backend.app import main
+from backend.app.game import SERIES_LEN, series_points
+
+
+def reference_series_points(seed: int, open_p: float, close_p: float, n: int):
+    # series_points() в том виде, в каком он был до выноса инвариантов из цикла
+    if n < 2:
+        return [open_p]
+
+    amp = max(0.05, abs(close_p - open_p) * 0.35 + 0.08)
+    pts = []
+    for i in range(n):
+        t = i / (n - 1)
+        base = open_p + (close_p - open_p) * t
+
+        a = (seed % 997) / 997.0
+        b = (seed % 389) / 389.0
+        c = (seed % 127) / 127.0
+
+        w1 = math.sin((t * math.tau) * (2.0 + 6.0 * a) + (seed % 1000) * 0.001)
+        w2 = math.sin((t * math.tau) * (5.0 + 9.0 * b) + (seed % 777) * 0.002)
+        w3 = math.sin((t * math.tau) * (9.0 + 7.0 * c) + (seed % 555) * 0.003)
+
+        noise = (w1 * 0.55 + w2 * 0.30 + w3 * 0.15) * amp
+        pts.append(base + noise)
+
+    pts[0] = open_p
+    pts[-1] = close_p
+    return pts
+
+
+def check_points(seeds: int):
+    rnd = random.Random(seeds)
+    for _ in range(seeds):
+        seed = rnd.getrandbits(32)
+        o = round(rnd.uniform(50.0, 150.0), 2)
+        c = round(o + rnd.uniform(-2.0, 2.0), 2)
+        n = rnd.choice((2, 3, SERIES_LEN, 1000))
+        assert series_points(seed, o, c, n) == reference_series_points(seed, o, c, n), (seed, o, c, n)
+
+
+def legacy_series():
+    # так /series работал до кэша: кривая строится заново на каждый запрос прежним циклом
+    r = main.scheduler.round
+    pts = reference_series_points(r.seed, r.open, r.close, SERIES_LEN)
+    return {
+        "round_id": r.round_id,
+        "phase": r.phase,
+        "server_ms": main.now_ms(),
+        "start_ms": r.start_ms,
+        "end_ms": r.end_ms,
+        "gold_mult": r.gold_mult,
+        "points": pts,
+    }
+
+
+def rps(client: TestClient, path: str, n: int) -> float:
+    for _ in range(50):
+        client.get(path)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        r = client.get(path)
+        assert r.status_code == 200
+    return n / (time.perf_counter() - t0)
+
+
+def main_():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=3000)
+    ap.add_argument("--seeds", type=int, default=3000, help="сколько кривых сверить с прежним циклом")
+    args = ap.parse_args()
+
+    check_points(args.seeds)
+    print(f"series_points == reference on {args.seeds} seeds")
+
+    main.app.add_api_route("/_legacy_series", legacy_series, methods=["GET"])
+    client = TestClient(main.app)
+
+    assert client.get("/series").json()["points"] == client.get("/_legacy_series").json()["points"]
+
+    before = rps(client, "/_legacy_series", args.requests)
+    after = rps(client, "/series", args.requests)
+    print(f"before: {before:8.0f} req/s")
+    print(f"after:  {after:8.0f} req/s  (x{after / before:.2f})")
+
+    # чистая стоимость построения кривой без HTTP
+    seed = main.scheduler.round.seed
+    for name, fn in (("reference", reference_series_points), ("series_points", series_points)):
+        t0 = time.perf_counter()
+        for _ in range(args.requests):
+            fn(seed, 100.0, 101.0, SERIES_LEN)
+        print(f"{name + ':':<15}{(time.perf_counter() - t0) / args.requests * 1e6:6.1f} us/call")
+
+
+if __name__ == "__main__":
+    main_()
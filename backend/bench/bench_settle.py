@@ -0,0 +1,84 @@
+"""Расчёт раунда: векторный Ledger.settle против прежнего цикла по dict-ставкам.
+
+Проверяет, что балансы и last_result совпадают один в один, и печатает время.
+Запуск из корня репозитория:
+    python -m backend.bench.bench_settle [--sizes 1000,10000,100000,1000000]
+"""
+import argparse
+import random
+import time
+
+from backend.app.bets import Ledger
+from backend.app.game import Round
+
+
+def reference_settle(r: Round, users, bets, last_results):
+    # settle_round() в том виде, в каком он был до колонок
+    rid, o, c, gold = r.round_id, r.open, r.close, r.gold_mult
+    up = c > o
+    for user_id, bet in list(bets.items()):
+        side = bet["side"]
+        amount = float(bet["amount"])
+        insurance = bool(bet.get("insurance", False))
+
+        win = (side == "LONG" and up) or (side == "SHORT" and (not up))
+        if win:
+            payout = amount * 2.0
+            if gold > 0:
+                payout *= gold
+        else:
+            payout = amount * (0.5 if insurance else 0.0)
+
+        users[user_id] += payout
+        last_results[user_id] = {
+            "round_id": rid, "win": win, "payout": payout, "gold_mult": gold, "open": o, "close": c,
+            "side": side, "amount": amount, "insurance": insurance,
+        }
+
+
+def run(n: int, gold: int, check: bool):
+    rnd = random.Random(n + gold)
+    r = Round(round_id=7, phase="DONE", start_ms=0, end_ms=0, seed=0, gold_mult=gold,
+              open=100.0, close=100.0 + rnd.choice((-0.5, 0.0, 0.5)))
+
+    ledger = Ledger()
+    users, bets, last_results = {}, {}, {}
+    for k in range(n):
+        uid = f"u{k}"
+        side = rnd.choice(("LONG", "SHORT"))
+        amount = round(rnd.uniform(0.1, 4.0), 2)
+        ins = rnd.random() < 0.3
+        ledger.place_bet(uid, side, amount, ins)
+        users[uid] = 10.0 - (amount + (0.5 if ins else 0.0))
+        bets[uid] = {"side": side, "amount": amount, "insurance": ins}
+
+    t0 = time.perf_counter()
+    reference_settle(r, users, bets, last_results)
+    t_ref = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ledger.settle(r)
+    t_vec = time.perf_counter() - t0
+
+    if check:
+        for uid in users:
+            assert ledger.balance(uid) == users[uid], uid
+            assert ledger.last_result(uid) == last_results[uid], uid
+    return t_ref, t_vec
+
+
+def main_():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,10000,100000,1000000")
+    ap.add_argument("--no-check", action="store_true")
+    args = ap.parse_args()
+
+    print(f"{'bets':>9}{'gold':>6}{'loop ms':>11}{'vector ms':>11}{'speedup':>9}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        for gold in (0, 3):
+            t_ref, t_vec = run(n, gold, not args.no_check)
+            print(f"{n:>9}{gold:>6}{t_ref * 1e3:>11.2f}{t_vec * 1e3:>11.2f}{t_ref / t_vec:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,70 @@
+"""Тик клиента: /init + /series + /mybet против одного /state?since=… с ETag.
+
+Время раунда сдвигается на 1 с за тик (как реальный опрос раз в секунду),
+так что /state каждый раз отдаёт ~10 новых точек; в фазе BET — 304.
+Запуск из корня репозитория:
+    python -m backend.bench.bench_state [--ticks 300]
+"""
+import argparse
+import time
+from dataclasses import replace
+
+from fastapi.testclient import TestClient
+
+from backend.app import main
+from backend.app.game import BET_SEC, RUN_SEC
+
+
+def run_round(client: TestClient, ticks: int, mode: str):
+    uid = "bench"
+    r0 = main.scheduler.round
+    sent = recv = 0
+    lat = []
+    since, etag, rid = 0, None, None
+    t_now = main.now_ms()
+
+    for k in range(ticks):
+        # k-я секунда раунда: BET_SEC секунд ставок, потом RUN_SEC секунд графика
+        sec = k % (BET_SEC + RUN_SEC)
+        start = t_now + (BET_SEC - sec) * 1000
+        main.scheduler.round = replace(r0, phase="BET" if sec < BET_SEC else "RUN",
+                                       start_ms=start, end_ms=start + RUN_SEC * 1000)
+
+        t0 = time.perf_counter()
+        if mode == "legacy":
+            for path in (f"/init?user_id={uid}", "/series", f"/mybet?user_id={uid}"):
+                resp = client.get(path)
+                recv += len(resp.content) + sum(len(a) + len(b) for a, b in resp.headers.items())
+                sent += len(path)
+        else:
+            if sec == 0:
+                since = 0
+            path = f"/state?user_id={uid}&since={since}" + (f"&round_id={rid}" if rid else "")
+            headers = {"If-None-Match": etag} if etag else {}
+            resp = client.get(path, headers=headers)
+            sent += len(path) + sum(len(a) + len(b) for a, b in headers.items())
+            recv += len(resp.content) + sum(len(a) + len(b) for a, b in resp.headers.items())
+            if resp.status_code == 200:
+                d = resp.json()
+                since, etag, rid = d["next"], resp.headers["etag"], d["round_id"]
+        lat.append((time.perf_counter() - t0) * 1000)
+
+    main.scheduler.round = r0
+    lat.sort()
+    return sent / ticks, recv / ticks, lat[len(lat) // 2], lat[int(len(lat) * 0.99)]
+
+
+def main_():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ticks", type=int, default=(BET_SEC + RUN_SEC) * 8)
+    args = ap.parse_args()
+
+    client = TestClient(main.app)
+    print(f"{'mode':<8}{'req B/tick':>12}{'resp B/tick':>13}{'p50 ms':>9}{'p99 ms':>9}")
+    for mode in ("legacy", "state"):
+        up, down, p50, p99 = run_round(client, args.ticks, mode)
+        print(f"{mode:<8}{up:>12.0f}{down:>13.0f}{p50:>9.2f}{p99:>9.2f}")
+
+
+if __name__ == "__main__":
+    main_()
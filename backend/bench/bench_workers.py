@@ -0,0 +1,76 @@
+"""Пропускная способность с общим Redis-состоянием при разном числе uvicorn-воркеров.
+
+Нужен Redis: --redis-url redis://127.0.0.1:6379/0. Без него поднимается
+fakeredis TcpFakeServer — он однопоточный и сам становится потолком, так что
+цифры годятся только как проверка, что всё работает.
+
+Запуск из корня репозитория:
+    python -m backend.bench.bench_workers --workers 1,2,4 --seconds 10
+"""
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import random
+import time
+
+import httpx
+
+from backend.bench._util import start_fake_redis, start_uvicorn
+
+
+async def client_loop(base: str, users: int, concurrency: int, seconds: float) -> int:
+    done = 0
+    rnd = random.Random(os.getpid())
+
+    async def one(http: httpx.AsyncClient, deadline: float):
+        nonlocal done
+        while time.monotonic() < deadline:
+            uid = f"w{rnd.randrange(users)}"
+            await http.post("/bet", json={"user_id": uid, "side": rnd.choice(("LONG", "SHORT")), "amount": 0.01})
+            await http.get(f"/mybet?user_id={uid}")
+            await http.get(f"/init?user_id={uid}")
+            done += 3
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as http:
+        deadline = time.monotonic() + seconds
+        await asyncio.gather(*(one(http, deadline) for _ in range(concurrency)))
+    return done
+
+
+def client_proc(args):
+    return asyncio.run(client_loop(*args))
+
+
+def main_():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", default="1,2,4")
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--clients", type=int, default=4, help="процессов-генераторов нагрузки")
+    ap.add_argument("--concurrency", type=int, default=32, help="параллельных запросов на процесс")
+    ap.add_argument("--users", type=int, default=10_000)
+    ap.add_argument("--redis-url", default=os.environ.get("REDIS_URL", ""))
+    args = ap.parse_args()
+
+    redis_url = args.redis_url
+    if not redis_url:
+        redis_url = start_fake_redis()
+        print("no --redis-url: using fakeredis TcpFakeServer (serial, numbers are not representative)")
+
+    print(f"{'workers':>8}{'req/s':>10}")
+    for n in [int(x) for x in args.workers.split(",")]:
+        proc, base = start_uvicorn(n, {"STATE_BACKEND": "redis", "REDIS_URL": redis_url,
+                                       "REDIS_PREFIX": f"bench{n}-{int(time.time())}:"})
+        try:
+            with mp.Pool(args.clients) as pool:
+                job = (base, args.users, args.concurrency, args.seconds)
+                total = sum(pool.map(client_proc, [job] * args.clients))
+            print(f"{n:>8}{total / args.seconds:>10.0f}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main_()
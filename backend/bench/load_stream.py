@@ -0,0 +1,80 @@
+"""Нагрузочный стенд: опрос (/init + /series + /mybet раз в секунду) против SSE /stream.
+
+Поднимает локальный uvicorn, держит N клиентов и меряет CPU сервера и трафик.
+Запуск из корня репозитория:
+    python -m backend.bench.load_stream --clients 10,100,500 --seconds 20
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from backend.bench._util import start_uvicorn
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK  # utime + stime
+
+
+async def poll_client(http: httpx.AsyncClient, uid: str, deadline: float, stats: dict):
+    while time.monotonic() < deadline:
+        t0 = time.monotonic()
+        for path in (f"/init?user_id={uid}", "/series", f"/mybet?user_id={uid}"):
+            r = await http.get(path)
+            stats["bytes"] += len(r.content)
+            stats["requests"] += 1
+        await asyncio.sleep(max(0.0, 1.0 - (time.monotonic() - t0)))
+
+
+async def stream_client(http: httpx.AsyncClient, uid: str, deadline: float, stats: dict):
+    try:
+        async with http.stream("GET", f"/stream?user_id={uid}") as r:
+            stats["requests"] += 1
+            async for chunk in r.aiter_bytes():
+                stats["bytes"] += len(chunk)
+                if time.monotonic() >= deadline:
+                    break
+    except httpx.ReadTimeout:
+        pass
+
+
+async def run(mode: str, base: str, clients: int, seconds: float) -> dict:
+    stats = {"bytes": 0, "requests": 0}
+    limits = httpx.Limits(max_connections=clients + 10, max_keepalive_connections=clients + 10)
+    timeout = httpx.Timeout(10.0, read=seconds + 5)
+    client = poll_client if mode == "poll" else stream_client
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=timeout) as http:
+        deadline = time.monotonic() + seconds
+        await asyncio.gather(*(client(http, f"load{i}", deadline, stats) for i in range(clients)))
+    return stats
+
+
+def main_():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", default="10,100,500")
+    ap.add_argument("--seconds", type=float, default=20.0)
+    args = ap.parse_args()
+
+    proc, base = start_uvicorn()
+    try:
+        print(f"{'mode':<7}{'clients':>8}{'cpu %':>9}{'KiB/s':>12}{'req/s':>10}")
+        for n in [int(x) for x in args.clients.split(",")]:
+            for mode in ("poll", "stream"):
+                cpu0, t0 = cpu_seconds(proc.pid), time.monotonic()
+                stats = asyncio.run(run(mode, base, n, args.seconds))
+                dt = time.monotonic() - t0
+                cpu = (cpu_seconds(proc.pid) - cpu0) / dt * 100
+                print(f"{mode:<7}{n:>8}{cpu:>9.1f}{stats['bytes'] / dt / 1024:>12.1f}{stats['requests'] / dt:>10.1f}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main_()
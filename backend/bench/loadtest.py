@@ -0,0 +1,288 @@
+"""Нагрузочный прогон TradeBull API с имитацией реальных клиентов.
+
+Каждый пользователь ведёт себя как frontend/app.js в режиме опроса: раз в
+секунду /state (или --pattern legacy: /init + /series + /mybet), а в окне BET
+делает ставку; --burst доля ставит сразу на старте раунда, остальные — в
+случайный момент окна. Приложение гоняется in-process (ASGI, без сети) или в
+локальном uvicorn; можно указать и уже запущенный сервер через --url.
+
+Отчёт: пропускная способность, p50/p95/p99 по эндпоинтам, время расчёта
+раунда (из /health). Результат пишется в JSON; с --baseline прогон сравнивается
+с прошлым и регрессии помечаются (код возврата 1).
+
+Запуск из корня репозитория:
+    python -m backend.bench.loadtest --users 50,200 --seconds 40 --out bench.json
+    python -m backend.bench.loadtest --target uvicorn --users 200 --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from backend.bench._util import ROOT, percentile, start_fake_redis, start_uvicorn
+
+# сравнивать время расчёта, только если в обоих прогонах столько раундов
+MIN_SETTLES = 3
+
+
+class Stats:
+    def __init__(self):
+        self.lat: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.bets_ok = 0
+
+    async def call(self, name: str, req):
+        t0 = time.perf_counter()
+        try:
+            r = await req
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            return None
+        self.lat[name].append((time.perf_counter() - t0) * 1000)
+        if r.status_code >= 500:
+            self.errors[name] += 1
+        return r
+
+    def report(self, seconds: float) -> dict:
+        endpoints = {}
+        for name, xs in sorted(self.lat.items()):
+            endpoints[name] = {
+                "count": len(xs),
+                "errors": self.errors.get(name, 0),
+                "rps": len(xs) / seconds,
+                "p50_ms": percentile(xs, 0.50),
+                "p95_ms": percentile(xs, 0.95),
+                "p99_ms": percentile(xs, 0.99),
+            }
+        total = sum(len(xs) for xs in self.lat.values())
+        return {"throughput_rps": total / seconds, "bets_ok": self.bets_ok, "endpoints": endpoints}
+
+
+async def user(http: httpx.AsyncClient, uid: str, args, stats: Stats, deadline: float):
+    rnd = random.Random(uid)
+    since, round_id, bet_round, bet_at = 0, None, None, None
+    seen_round, wants_bet = None, False
+    bursty = rnd.random() < args.burst
+
+    # клиенты подключаются не одновременно
+    await asyncio.sleep(rnd.random())
+    while time.monotonic() < deadline:
+        tick = time.monotonic()
+
+        if args.pattern == "legacy":
+            await stats.call("/init", http.get(f"/init?user_id={uid}"))
+            r = await stats.call("/series", http.get("/series"))
+            await stats.call("/mybet", http.get(f"/mybet?user_id={uid}"))
+        else:
+            q = f"/state?user_id={uid}&since={since}" + (f"&round_id={round_id}" if round_id else "")
+            r = await stats.call("/state", http.get(q))
+        if r is None or r.status_code != 200:
+            await asyncio.sleep(1.0)
+            continue
+        s = r.json()
+        if args.pattern != "legacy":
+            since, round_id = s["next"], s["round_id"]
+
+        # ставить ли в этом раунде — решаем один раз на раунд, а не на каждом тике окна BET
+        if s["round_id"] != seen_round:
+            seen_round, wants_bet, bet_at = s["round_id"], rnd.random() < args.bet_prob, None
+
+        # ставка в окне BET: часть пользователей — сразу на старте раунда, остальные в случайный момент
+        if s["phase"] == "BET" and bet_round != s["round_id"] and wants_bet:
+            left = max(0.0, (s["start_ms"] - s["server_ms"]) / 1000)
+            if bet_at is None:
+                bet_at = time.monotonic() + (0.0 if bursty else rnd.uniform(0.0, left))
+            if time.monotonic() >= bet_at:
+                br = await stats.call("/bet", http.post("/bet", json={
+                    "user_id": uid,
+                    "side": rnd.choice(("LONG", "SHORT")),
+                    "amount": 0.1,
+                    "insurance": rnd.random() < 0.2,
+                }))
+                if br is not None and br.status_code == 200:
+                    stats.bets_ok += 1
+                bet_round, bet_at = s["round_id"], None
+        elif s["phase"] != "BET":
+            bet_at = None
+
+        await asyncio.sleep(max(0.0, 1.0 - (time.monotonic() - tick)))
+
+
+def settle_summary(xs: List[float]) -> dict:
+    return {
+        "count": len(xs),
+        "p50": percentile(xs, 0.50),
+        "p99": percentile(xs, 0.99),
+        "max": max(xs) if xs else None,
+    }
+
+
+async def run_users(http: httpx.AsyncClient, n: int, args) -> dict:
+    # сервер общий для всех размеров: считаем только раунды, начатые во время этого прогона
+    first_round = (await http.get("/health")).json()["scheduler"]["round_id"]
+
+    stats = Stats()
+    deadline = time.monotonic() + args.seconds
+    t0 = time.monotonic()
+    await asyncio.gather(*(user(http, f"lt{n}-{i}", args, stats, deadline) for i in range(n)))
+    out = stats.report(time.monotonic() - t0)
+
+    settled = (await http.get("/health")).json()["scheduler"].get("settled", [])
+    out["settle_ms"] = settle_summary([ms for rid, ms in settled if rid > first_round])
+    return out
+
+
+async def run_inprocess(ns: List[int], args) -> List[dict]:
+    from backend.app import main
+
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30) as http:
+            for n in ns:
+                results.append({"users": n, **await run_users(http, n, args)})
+    return results
+
+
+async def run_remote(base: str, ns: List[int], args) -> List[dict]:
+    results = []
+    for n in ns:
+        limits = httpx.Limits(max_connections=n + 10, max_keepalive_connections=n + 10)
+        async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as http:
+            results.append({"users": n, **await run_users(http, n, args)})
+    return results
+
+
+def server_env(args) -> dict:
+    # в memory каждый воркер держал бы свои балансы, ставки и раунды — несколько воркеров только через Redis
+    if args.workers <= 1:
+        return {}
+    redis_url = args.redis_url
+    if not redis_url:
+        redis_url = start_fake_redis()
+        print("no --redis-url: using fakeredis TcpFakeServer (serial, numbers are not representative)")
+    print("note: settle_ms comes from whichever worker answers /health; only the leader settles")
+    return {"STATE_BACKEND": "redis", "REDIS_URL": redis_url, "REDIS_PREFIX": f"lt{int(time.time())}:"}
+
+
+def git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base: dict, cur: dict, tolerance: float) -> List[str]:
+    """Регрессии: p95/p99 выросли или пропускная способность упала больше чем на tolerance."""
+    found = []
+    old_runs = {r["users"]: r for r in base.get("runs", [])}
+    for run in cur["runs"]:
+        old = old_runs.get(run["users"])
+        if old is None:
+            continue
+        if run["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+            found.append(f"users={run['users']}: throughput {old['throughput_rps']:.1f} -> {run['throughput_rps']:.1f} rps")
+        for name, ep in run["endpoints"].items():
+            prev = old["endpoints"].get(name)
+            if prev is None:
+                continue
+            for key in ("p95_ms", "p99_ms"):
+                if prev[key] and ep[key] and ep[key] > prev[key] * (1 + tolerance):
+                    found.append(f"users={run['users']} {name}: {key} {prev[key]:.2f} -> {ep[key]:.2f} ms")
+        os_, cs = old.get("settle_ms") or {}, run.get("settle_ms") or {}
+        if min(os_.get("count", 0), cs.get("count", 0)) < MIN_SETTLES:
+            continue  # по одному-двум расчётам p99 ничего не значит
+        o, c = os_.get("p99"), cs.get("p99")
+        if o and c and c > o * (1 + tolerance):
+            found.append(f"users={run['users']}: settle p99 {o:.2f} -> {c:.2f} ms")
+    return found
+
+
+def print_table(runs: List[dict]):
+    print(f"{'users':>6} {'endpoint':<9}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>6}")
+    for run in runs:
+        for name, ep in run["endpoints"].items():
+            print(f"{run['users']:>6} {name:<9}{ep['rps']:>9.1f}"
+                  f"{ep['p50_ms']:>9.2f}{ep['p95_ms']:>9.2f}{ep['p99_ms']:>9.2f}{ep['errors']:>6}")
+        settle = run.get("settle_ms") or {}
+        print(f"{run['users']:>6} total    {run['throughput_rps']:>9.1f}  bets ok {run['bets_ok']}, "
+              f"settle p99 {settle.get('p99')} ms over {settle.get('count', 0)} rounds")
+
+
+def main_():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", default="50,200", help="список размеров через запятую")
+    ap.add_argument("--seconds", type=float, default=40.0,
+                    help=f"длительность прогона (раунд = 37 с; сравнение расчёта — от {MIN_SETTLES} раундов)")
+    ap.add_argument("--target", choices=("inprocess", "uvicorn"), default="inprocess")
+    ap.add_argument("--url", default="", help="уже запущенный сервер вместо --target")
+    ap.add_argument("--workers", type=int, default=1, help="воркеров для --target uvicorn (>1 — общий Redis)")
+    ap.add_argument("--redis-url", default=os.environ.get("REDIS_URL", ""),
+                    help="Redis для --workers > 1; без него — fakeredis TcpFakeServer")
+    ap.add_argument("--pattern", choices=("state", "legacy"), default="state")
+    ap.add_argument("--bet-prob", type=float, default=0.6, help="доля пользователей, ставящих в раунде")
+    ap.add_argument("--burst", type=float, default=0.5, help="доля ставящих сразу на старте BET")
+    ap.add_argument("--out", default="", help="куда записать JSON")
+    ap.add_argument("--baseline", default="", help="JSON прошлого прогона для сравнения")
+    ap.add_argument("--tolerance", type=float, default=0.15)
+    args = ap.parse_args()
+
+    if args.workers > 1 and (args.url or args.target != "uvicorn"):
+        ap.error("--workers > 1 needs --target uvicorn")
+    ns = [int(x) for x in args.users.split(",")]
+    proc = None
+    try:
+        if args.url:
+            runs = asyncio.run(run_remote(args.url, ns, args))
+        elif args.target == "uvicorn":
+            proc, base = start_uvicorn(args.workers, server_env(args))
+            runs = asyncio.run(run_remote(base, ns, args))
+        else:
+            runs = asyncio.run(run_inprocess(ns, args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    result = {
+        "meta": {
+            "git": git_rev(),
+            "time": int(time.time()),
+            "target": args.url or args.target,
+            "workers": args.workers,
+            "backend": None if args.url else ("redis" if args.workers > 1 else "memory"),
+            "pattern": args.pattern,
+            "seconds": args.seconds,
+            "bet_prob": args.bet_prob,
+            "burst": args.burst,
+        },
+        "runs": runs,
+    }
+    print_table(runs)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            base = json.load(f)
+        for key in ("target", "workers", "pattern", "seconds"):
+            if base.get("meta", {}).get(key) != result["meta"][key]:
+                print(f"warning: baseline {key}={base.get('meta', {}).get(key)!r}, this run {result['meta'][key]!r}")
+        regressions = compare(base, result, args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_()
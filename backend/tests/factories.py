@@ -0,0 +1,7 @@
+from backend.app.game import Round
+
+
+def make_round(round_id: int, phase: str = "BET", gold: int = 0, close: float = 100.5, start_ms: int = 0) -> Round:
+    """Раунд с заранее известным исходом (open 100.0) без таймеров и генерации серии."""
+    return Round(round_id=round_id, phase=phase, start_ms=start_ms, end_ms=start_ms, seed=0, gold_mult=gold,
+                 open=100.0, close=close)
@@ -0,0 +1,40 @@
+"""CandleHistory: seq и группы не зависят от того, с какого раунда процесс начал."""
+from backend.app.candles import CANDLES_PER_ROUND, ROUNDS_PER_GROUP, CandleHistory
+from backend.app.game import Round
+from backend.tests.factories import make_round
+
+CANDLES = [(100.0, 101.0, 99.0, 100.5)] * CANDLES_PER_ROUND
+
+
+def make_round_at(round_id: int) -> Round:
+    return make_round(round_id, "DONE", start_ms=round_id * 37_000)
+
+
+def history(first: int, last: int) -> CandleHistory:
+    h = CandleHistory()
+    for rid in range(first, last + 1):
+        h.add_round(make_round_at(rid), CANDLES)
+    return h
+
+
+def test_workers_started_at_different_rounds_agree():
+    early, late = history(1, 25), history(7, 25)
+    for res in ("10p", "round"):
+        a, b = early.page(res, limit=10), late.page(res, limit=10)
+        assert (a["from"], a["next"], a["candles"]) == (b["from"], b["next"], b["candles"])
+    assert early.page("round", from_seq=7, limit=3) == {**late.page("round", from_seq=7, limit=3), "first": 1}
+
+
+def test_groups_follow_round_ids():
+    h = history(7, 25)  # первая группа (1..10) видна не целиком и не выдаётся
+    page = h.page(f"{ROUNDS_PER_GROUP}r")
+    assert (page["first"], page["next"]) == (1, 2)
+    assert page["candles"][0]["time"] == make_round_at(11).start_ms // 1000
+
+
+def test_paging_by_next():
+    h = history(1, 3)
+    page = h.page("10p", from_seq=0, limit=CANDLES_PER_ROUND)
+    assert page["from"] == CANDLES_PER_ROUND  # seq первой свечи раунда 1
+    page = h.page("10p", from_seq=page["next"], limit=CANDLES_PER_ROUND)
+    assert page["from"] == 2 * CANDLES_PER_ROUND and len(page["candles"]) == CANDLES_PER_ROUND
@@ -0,0 +1,105 @@
+"""Journal: восстановление снимок + хвост и поведение при ошибке записи."""
+import threading
+
+import pytest
+
+from backend.app import journal as journal_mod
+from backend.app.bets import START_BALANCE, Ledger
+from backend.app.journal import Journal, JournalError, recover, round_record
+from backend.tests.factories import make_round
+
+
+def open_ledger(path) -> Ledger:
+    ledger = Ledger()
+    j = Journal(str(path), flush_ms=0.5)
+    recover(j, ledger)
+    j.open()
+    ledger.journal = j
+    return ledger
+
+
+def test_recover_snapshot_and_tail(tmp_path):
+    ledger = open_ledger(tmp_path)
+    ledger.place_bet("a", "LONG", 2.0, False)
+    ledger.place_bet("b", "SHORT", 1.0, True)
+    ledger.settle(make_round(1, "DONE"))
+    ledger.clear_bets()
+
+    cols, ids, segment = ledger.export()
+    ledger.journal.write_snapshot(cols, ids, {"segment": segment, "round": None})
+    ledger.journal.append(round_record("round", make_round(2, "BET")))
+    ledger.place_bet("a", "SHORT", 1.0, False)
+    ledger.journal.close()
+
+    restored = Ledger()
+    last, applied = recover(Journal(str(tmp_path)), restored)
+    assert last == make_round(2, "BET")
+    assert applied == 2
+    for uid in ("a", "b"):
+        assert restored.balance(uid) == ledger.balance(uid)
+    assert restored.get_bet("a") == {"side": "SHORT", "amount": 1.0, "insurance": False}
+    assert restored.last_result("b")["round_id"] == 1
+
+
+def test_torn_tail_is_skipped(tmp_path):
+    ledger = open_ledger(tmp_path)
+    ledger.place_bet("a", "LONG", 2.0, False)
+    ledger.journal.close()
+    with open(ledger.journal._segment_path(1), "ab") as f:
+        f.write(b'deadbeef {"t":"bet","u":"b"')
+
+    restored = Ledger()
+    _, applied = recover(Journal(str(tmp_path)), restored)
+    assert applied == 1
+    assert restored.bet_count() == 1
+
+
+def test_write_error_fails_bets_instead_of_hanging(tmp_path, monkeypatch):
+    ledger = open_ledger(tmp_path)
+    ledger.place_bet("a", "LONG", 1.0, False)
+
+    def broken_fsync(fd):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(journal_mod.os, "fsync", broken_fsync)
+    done = threading.Event()
+    errors = []
+
+    def bet():
+        try:
+            ledger.place_bet("b", "LONG", 1.0, False)
+        except JournalError as e:
+            errors.append(e)
+        done.set()
+
+    threading.Thread(target=bet, daemon=True).start()
+    assert done.wait(5), "place_bet hung after a journal write error"
+    assert errors and isinstance(errors[0].__cause__, OSError)
+    # ставка, не попавшая на диск, откатана и в памяти
+    assert ledger.get_bet("b") is None
+    assert ledger.balance("b") == START_BALANCE
+    assert ledger.bet_count() == 1
+    assert ledger.get_bet("a") == {"side": "LONG", "amount": 1.0, "insurance": False}
+
+    # дальше журнал стоит: ставка отклоняется сразу и баланс не трогается
+    with pytest.raises(JournalError):
+        ledger.place_bet("c", "LONG", 1.0, False)
+    assert ledger.get_bet("c") is None
+    ledger.journal.close()
+
+
+def test_failed_repeat_bet_restores_previous_bet(tmp_path, monkeypatch):
+    ledger = open_ledger(tmp_path)
+    ledger.place_bet("a", "LONG", 1.0, False)
+    ledger.place_bet("b", "SHORT", 2.0, True)
+
+    def broken_fsync(fd):
+        raise OSError(5, "Input/output error")
+
+    monkeypatch.setattr(journal_mod.os, "fsync", broken_fsync)
+    with pytest.raises(JournalError):
+        ledger.place_bet("a", "SHORT", 3.0, True)
+    assert ledger.get_bet("a") == {"side": "LONG", "amount": 1.0, "insurance": False}
+    assert ledger.balance("a") == START_BALANCE - 1.0
+    assert ledger.get_bet("b") == {"side": "SHORT", "amount": 2.0, "insurance": True}
+    ledger.journal.close()
@@ -0,0 +1,164 @@
+"""RedisLedger / RedisRounds поверх fakeredis (Lua через lupa).
+
+Запуск:
+    pip install -r backend/requirements-dev.txt
+    python -m pytest
+"""
+import random
+
+import fakeredis
+import pytest
+
+from backend.app.bets import INSURANCE_FEE, START_BALANCE, BetError, Ledger
+from backend.app.game import Round
+from backend.app.redis import RedisLedger, RedisRounds, _RedisPy
+from backend.tests.factories import make_round
+
+
+def open_round(conn, r: Round) -> RedisRounds:
+    rounds = RedisRounds(conn)
+    assert rounds.lead()
+    assert rounds.save(r)
+    return rounds
+
+
+@pytest.fixture
+def conn():
+    return _RedisPy(fakeredis.FakeRedis(decode_responses=True))
+
+
+@pytest.fixture
+def ledger(conn):
+    open_round(conn, make_round(1))
+    led = RedisLedger(conn)
+    led.on_round(make_round(1))
+    return led
+
+
+def test_place_bet_debits_and_records(ledger):
+    bal = ledger.place_bet("a", "LONG", 2.0, True)
+    assert bal == START_BALANCE - 2.0 - INSURANCE_FEE
+    assert ledger.balance("a") == bal
+    assert ledger.get_bet("a") == {"side": "LONG", "amount": 2.0, "insurance": True}
+    assert ledger.bet_count() == 1
+
+
+def test_place_bet_not_enough_balance(ledger):
+    with pytest.raises(BetError, match="Not enough balance"):
+        ledger.place_bet("a", "LONG", START_BALANCE, True)
+    assert ledger.balance("a") == START_BALANCE
+    assert ledger.get_bet("a") is None
+
+
+def test_place_bet_rejected_once_round_left_bet(conn, ledger):
+    # воркер ещё видит BET, а лидер уже перевёл раунд в RUN
+    rounds = RedisRounds(conn)
+    rounds.me = conn.get(rounds.leader_key)
+    assert rounds.save(make_round(1, "RUN"))
+    with pytest.raises(BetError, match="Betting closed"):
+        ledger.place_bet("a", "LONG", 1.0, False)
+    assert ledger.balance("a") == START_BALANCE
+    assert ledger.bet_count() == 0
+
+
+def test_place_bet_rejected_for_stale_round(conn, ledger):
+    rounds = RedisRounds(conn)
+    rounds.me = conn.get(rounds.leader_key)
+    assert rounds.save(make_round(2))
+    with pytest.raises(BetError, match="Betting closed"):
+        ledger.place_bet("a", "LONG", 1.0, False)
+
+
+def test_repeat_bet_replaces_bet_and_debits_again(ledger):
+    # как и в памяти: повторная ставка перезаписывает прежнюю, списание — за обе
+    ledger.place_bet("a", "LONG", 1.0, False)
+    bal = ledger.place_bet("a", "SHORT", 3.0, False)
+    assert bal == START_BALANCE - 4.0
+    assert ledger.get_bet("a") == {"side": "SHORT", "amount": 3.0, "insurance": False}
+    assert ledger.bet_count() == 1
+
+
+@pytest.mark.parametrize("gold,close", [(0, 100.5), (0, 99.5), (0, 100.0), (3, 101.0)])
+def test_settle_matches_memory_ledger(conn, gold, close):
+    r = make_round(1, "DONE", gold, close)
+    open_round(conn, make_round(1))
+    mem, red = Ledger(), RedisLedger(conn)
+    red.on_round(r)
+    rnd = random.Random(gold)
+    for k in range(300):
+        uid, side = f"u{k}", rnd.choice(("LONG", "SHORT"))
+        amount, ins = round(rnd.uniform(0.1, 4.0), 2), rnd.random() < 0.3
+        assert mem.place_bet(uid, side, amount, ins) == red.place_bet(uid, side, amount, ins)
+
+    mem.settle(r)
+    red.settle(r)
+    mem.clear_bets()
+    red.clear_bets()
+    assert red.bet_count() == 0
+    for k in range(300):
+        uid = f"u{k}"
+        assert red.balance(uid) == pytest.approx(mem.balance(uid))
+        assert red.last_result(uid) == pytest.approx(mem.last_result(uid))
+
+    ids = [f"u{k}" for k in range(300)] + ["nobody"]
+    assert red.results_for(ids, 1) == pytest.approx(mem.results_for(ids, 1))
+    assert len(red.results_for(ids, 1)) == 300
+    assert red.results_for(ids, 2) == []
+
+
+def test_settle_twice_pays_once(conn):
+    # новый лидер подхватил DONE и считает тот же раунд ещё раз
+    r = make_round(1, "DONE")
+    open_round(conn, make_round(1))
+    a, b = RedisLedger(conn), RedisLedger(conn)
+    a.on_round(r)
+    b.on_round(r)
+    a.place_bet("a", "LONG", 2.0, False)
+    a.settle(r)
+    b.settle(r)
+    a.clear_bets()
+    assert b.balance("a") == START_BALANCE + 2.0
+
+
+def test_on_round_clears_last_result_cache(conn, ledger):
+    ledger.place_bet("a", "LONG", 1.0, False)
+    assert ledger.last_result("a") is None  # теперь None закэширован
+
+    other = RedisLedger(conn)  # «другой воркер» рассчитывает раунд
+    other.on_round(make_round(1))
+    other.settle(make_round(1, "DONE"))
+    assert ledger.last_result("a") is None  # до смены раунда — из кэша
+
+    ledger.on_round(make_round(2))
+    assert ledger.last_result("a")["round_id"] == 1
+
+
+def test_leader_acquire_and_renew(conn):
+    a, b = RedisRounds(conn), RedisRounds(conn)
+    assert a.lead()
+    assert not b.lead()
+    assert a.lead()  # продление своим же ключом
+    assert conn.pttl(a.leader_key) > 0
+
+    conn.delete(a.leader_key)  # лидерство истекло
+    assert b.lead()
+    assert not a.lead()
+
+
+def test_rounds_save_and_load(conn):
+    rounds = RedisRounds(conn)
+    assert rounds.load() is None
+    assert rounds.lead()
+    r = make_round(5, "RUN")
+    assert rounds.save(r)
+    assert rounds.load() == r
+
+
+def test_stale_leader_cannot_save(conn):
+    a, b = RedisRounds(conn), RedisRounds(conn)
+    assert a.lead()
+    conn.delete(a.leader_key)  # a завис дольше LEADER_TTL_MS
+    assert b.lead()
+    assert b.save(make_round(6))
+    assert not a.save(make_round(5, "DONE"))
+    assert a.load() == make_round(6)
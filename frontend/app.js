@@ -41,9 +41,10 @@ function setupTelegramUI() {
 let chart, candleSeries;
 let lastRoundId = null;
 
-// “лента” свечей (вся история)
+// “лента” свечей: история с сервера (/candles) + новые; держим не больше MAX_CANDLES
+const MAX_CANDLES = 5000;
 let allCandles = [];
-let lastCandleTime = Math.floor(Date.now() / 1000) - 120;
+let lastCandleTime = 0;
 
 // чтобы “достраивать” свечи по мере прихода points
 let lastVisiblePoints = 0;
@@ -101,7 +102,8 @@ function updateTimer(phase, server_ms, start_ms, end_ms) {
 }
 
 // Берём новые points и превращаем в новые свечи (по 10 точек на свечу)
-function appendCandlesFromPoints(points, fromIndex) {
+// baseTime — секунда старта RUN, как у свечей /candles?res=10p
+function appendCandlesFromPoints(points, fromIndex, baseTime) {
   // fromIndex — сколько points мы уже обработали
   // делаем свечи только из “полных” чанков по 10
   const maxFull = Math.floor(points.length / POINTS_PER_CANDLE) * POINTS_PER_CANDLE;
@@ -115,50 +117,123 @@ function appendCandlesFromPoints(points, fromIndex) {
     let high = -Infinity, low = Infinity;
     for (const p of slice) { if (p > high) high = p; if (p < low) low = p; }
 
-    lastCandleTime += 1;
-    out.push({ time: lastCandleTime, open, high, low, close });
+    out.push({ time: baseTime + i / POINTS_PER_CANDLE, open, high, low, close });
   }
   return { candles: out, newIndex: maxFull };
 }
 
+function pushCandle(c) {
+  if (c.time <= lastCandleTime) return; // уже есть из истории
+  lastCandleTime = c.time;
+  allCandles.push(c);
+  if (allCandles.length > MAX_CANDLES) allCandles.splice(0, allCandles.length - MAX_CANDLES);
+  candleSeries.update(c);
+}
+
+// история завершённых раундов одним запросом
+async function loadHistory() {
+  const h = await jget(`/candles?res=10p&limit=${MAX_CANDLES}`);
+  allCandles = h.candles;
+  if (allCandles.length) lastCandleTime = allCandles[allCandles.length - 1].time;
+  candleSeries.setData(allCandles);
+}
+
+// ===== Polling (если нет EventSource) =====
+// один /state за тик: только новые points после since, 304 если ничего не поменялось
+let roundPoints = [];
+let stateEtag = null;
+
 async function refresh() {
   const user_id = getUserId();
   el("userLabel").textContent = user_id;
 
-  const init = await jget(`/init?user_id=${encodeURIComponent(user_id)}`);
-  el("balance").textContent = fmt(init.balance);
-
-  const s = await jget(`/series`);
-  el("roundId").textContent = String(s.round_id);
-  el("phase").textContent = s.phase;
-  el("gold").textContent = s.gold_mult ? ("x" + s.gold_mult) : "—";
-  updateTimer(s.phase, s.server_ms, s.start_ms, s.end_ms);
+  const q = `user_id=${encodeURIComponent(user_id)}&since=${roundPoints.length}` +
+    (lastRoundId !== null ? `&round_id=${lastRoundId}` : "");
+  const res = await fetch(`${API}/state?${q}`, { headers: stateEtag ? { "If-None-Match": stateEtag } : {} });
+  if (res.status === 304) {
+    if (roundHead) updateTimer(roundHead.phase, Date.now() + clockOffset, roundHead.start_ms, roundHead.end_ms);
+    return;
+  }
+  const txt = await res.text();
+  if (!res.ok) throw new Error(txt);
+  stateEtag = res.headers.get("ETag");
+  const s = JSON.parse(txt);
 
   // новый раунд? — не очищаем график, просто начинаем “строить” новые свечи
   if (lastRoundId !== s.round_id) {
-    lastRoundId = s.round_id;
-    lastVisiblePoints = 0; // для нового раунда начинаем с нуля points
+    roundPoints = [];
+    lastVisiblePoints = 0;
   }
+  showRound(s);
+  el("balance").textContent = fmt(s.balance);
 
   // ДОБАВЛЯЕМ новые свечи, а не перерисовываем всё
-  const { candles, newIndex } = appendCandlesFromPoints(s.points, lastVisiblePoints);
+  roundPoints.push(...s.points);
+  const { candles, newIndex } = appendCandlesFromPoints(roundPoints, lastVisiblePoints, Math.floor(s.start_ms / 1000));
   lastVisiblePoints = newIndex;
 
-  for (const c of candles) {
-    allCandles.push(c);
-    candleSeries.update(c);
-  }
+  for (const c of candles) pushCandle(c);
 
   // ставка
-  const my = await jget(`/mybet?user_id=${encodeURIComponent(user_id)}`);
-  if (my.bet) {
-    el("status").innerHTML =
-      `Your bet: <b>${my.bet.side}</b> amount <b>${my.bet.amount}</b> insurance <b>${my.bet.insurance ? "ON" : "OFF"}</b>`;
+  if (s.bet) {
+    showBet(s.bet);
   } else {
     el("status").textContent = "No bet in this round";
   }
 }
 
+// ===== Stream (SSE) =====
+// один поток вместо /init + /series + /mybet каждую секунду
+let roundHead = null;
+let clockOffset = 0; // server_ms - Date.now()
+let resultRoundId = null; // раунд, итог которого сейчас показан в #status
+
+function showRound(h) {
+  roundHead = h;
+  clockOffset = h.server_ms - Date.now();
+  el("roundId").textContent = String(h.round_id);
+  el("phase").textContent = h.phase;
+  el("gold").textContent = h.gold_mult ? ("x" + h.gold_mult) : "—";
+  updateTimer(h.phase, h.server_ms, h.start_ms, h.end_ms);
+
+  if (lastRoundId !== h.round_id) {
+    const prev = lastRoundId;
+    lastRoundId = h.round_id;
+    // итог прошлого раунда приходит за миллисекунду до нового раунда — не затираем его
+    if (h.phase === "BET" && resultRoundId !== prev) el("status").textContent = "No bet in this round";
+  }
+}
+
+function showBet(bet) {
+  el("status").innerHTML =
+    `Your bet: <b>${bet.side}</b> amount <b>${bet.amount}</b> insurance <b>${bet.insurance ? "ON" : "OFF"}</b>`;
+}
+
+function startStream() {
+  const user_id = getUserId();
+  el("userLabel").textContent = user_id;
+
+  const es = new EventSource(`${API}/stream?user_id=${encodeURIComponent(user_id)}`);
+  const on = (name, fn) => es.addEventListener(name, (e) => fn(JSON.parse(e.data)));
+
+  on("round", showRound);
+  on("balance", (d) => { el("balance").textContent = fmt(d.balance); });
+  on("candle", (d) => pushCandle({ time: d.time, open: d.open, high: d.high, low: d.low, close: d.close }));
+  on("bet", (d) => { showBet(d.bet); el("balance").textContent = fmt(d.balance); });
+  on("result", (d) => {
+    resultRoundId = d.round_id;
+    el("balance").textContent = fmt(d.balance);
+    el("status").innerHTML = d.win
+      ? `<span class="ok">WIN</span> round ${d.round_id}, payout ${fmt(d.payout)}`
+      : `<span class="warn">LOSE</span> round ${d.round_id}, payout ${fmt(d.payout)}`;
+  });
+
+  // таймер тикает локально по часам сервера
+  setInterval(() => {
+    if (roundHead) updateTimer(roundHead.phase, Date.now() + clockOffset, roundHead.start_ms, roundHead.end_ms);
+  }, 200);
+}
+
 async function placeBet(side) {
   try {
     const user_id = getUserId();
@@ -176,8 +251,14 @@ async function placeBet(side) {
 setupTelegramUI();
 initChart();
 
-refresh().catch(err => el("status").textContent = String(err));
-// 1 раз в секунду — нормальная скорость “как биржа”
-setInterval(() => refresh().catch(()=>{}), 1000);
+loadHistory().catch(() => {}).then(() => {
+  if (window.EventSource) {
+    startStream();
+  } else {
+    // старый путь: опрос раз в секунду
+    refresh().catch(err => el("status").textContent = String(err));
+    setInterval(() => refresh().catch(()=>{}), 1000);
+  }
+});
 
 window.placeBet = placeBet;